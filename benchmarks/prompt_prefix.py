@@ -0,0 +1,84 @@
+"""
+Time-to-first-token of the agent prompts against a llama.cpp-style stub with a prompt prefix cache
+(FakeLabelChatModel with prefill_latency): the prompt shared with the previous request is free, every other
+character costs prefill time. The same requests are sent in three ways:
+- prefix:      the agents' layout (invariant system message first), each agent's requests back to back,
+- interleaved: the same layout, with the requests of the agents alternating,
+- data first:  the per-sentence fields before the instructions in a single message, each agent's requests back to back.
+
+Run from the repository root:
+    python -m benchmarks.prompt_prefix --sentences 50
+"""
+import time
+import argparse
+
+from modules import AgentInferenceAgent, MystificationClassifierAgent, VerifierAgent, FakeLabelChatModel, percentile
+
+_FILLER = "the committee reviewed the proposal and the report was sent to the board before the annual meeting"
+
+def agent_prompts() -> list:
+    """
+    The ChatPromptTemplates of the LLM agents with a label answer.
+    """
+    llm = FakeLabelChatModel()
+    agents = [AgentInferenceAgent(llm=llm, constrained=False), MystificationClassifierAgent(llm=llm, constrained=False),
+              VerifierAgent(llm=llm, constrained=False)]
+    return [agent.chain.first for agent in agents]
+
+def data_first(prompt):
+    """
+    The same prompt as a single message with the per-sentence fields before the instructions.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_template, human_template = (message.prompt.template for message in prompt.messages)
+    return ChatPromptTemplate.from_messages([("human", human_template + "\n\n" + system_template)])
+
+def sentence_inputs(prompt, i: int) -> dict:
+    words = _FILLER.split()
+    return {name: f"{name} {i}: " + " ".join(words[i % len(words):] + words[:i % len(words)]) for name in prompt.input_variables}
+
+def measure(requests: list, prefill_latency: float) -> dict:
+    """
+    Send (prompt, inputs) requests one at a time to a fresh stub.
+    :return: {'ttft_ms', 'p95_ms', 'prefix_hit_rate'}.
+    """
+    from langchain_core.output_parsers import StrOutputParser
+
+    llm = FakeLabelChatModel(prefill_latency=prefill_latency)
+    chains = {}
+    timings = []
+    for prompt, inputs in requests:
+        chain = chains.setdefault(id(prompt), prompt | llm | StrOutputParser())
+        start_time = time.perf_counter()
+        chain.invoke(inputs)
+        timings.append(time.perf_counter() - start_time)
+    return {
+        'ttft_ms': 1000 * sum(timings) / len(timings),
+        'p95_ms': 1000 * percentile(timings, 95),
+        'prefix_hit_rate': llm.prefix_hit_rate,
+    }
+
+def run_benchmark(num_sentences: int = 50, prefill_latency: float = 2e-5) -> dict:
+    """
+    :param num_sentences: requests per agent.
+    :param prefill_latency: seconds per uncached prompt character.
+    :return: layout -> measure() result.
+    """
+    prompts = agent_prompts()
+    data_first_prompts = [data_first(prompt) for prompt in prompts]
+    return {
+        'prefix': measure([(p, sentence_inputs(p, i)) for p in prompts for i in range(num_sentences)], prefill_latency),
+        'interleaved': measure([(p, sentence_inputs(p, i)) for i in range(num_sentences) for p in prompts], prefill_latency),
+        'data first': measure([(p, sentence_inputs(p, i)) for p in data_first_prompts for i in range(num_sentences)], prefill_latency),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-token of the agent prompt layouts against a prefix-caching stub.")
+    parser.add_argument("--sentences", type=int, default=50, help="requests per agent (default: 50)")
+    parser.add_argument("--prefill-latency", type=float, default=2e-5, help="seconds per uncached prompt character (default: 2e-5)")
+    args = parser.parse_args()
+
+    print(f"{'layout':<12} {'TTFT (ms)':>10} {'p95 (ms)':>10} {'prefix hit rate':>16}")
+    for layout, result in run_benchmark(args.sentences, args.prefill_latency).items():
+        print(f"{layout:<12} {result['ttft_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['prefix_hit_rate']:>16.1%}")
@@ -1,27 +1,23 @@
 import os
 import sys
 import json
+import argparse
 import multiprocessing
 from functools import partial
 from tqdm import tqdm
 import time
+import queue
+import threading
+import random
 import warnings
 
 warnings.filterwarnings("ignore")
 
 from dotenv import load_dotenv
 
-try:
-    from PassivePySrc import PassivePy
-except ImportError as e:
-    print(f"Cannot import PassivePy: {e}")
-    sys.exit(1)
-
-# from langchain_community.chat_models import ChatOpenAI # Uncomment if using OpenAI
-from langchain_community.chat_models import ChatOllama
-
 from modules import (
     read_txt_files_to_sentences_dict,
+    load_senter,
     split_text_into_sentences,
     get_passive_subject,
     convert_passive_verb_to_active,
@@ -33,16 +29,48 @@ from modules import (
     AgentClassifierAgent,
     VerifierAgent,
     AnnotatorAgent,
-    DeducibleAgent
+    ParquetAnnotatorAgent,
+    DeducibleAgent,
+    StageProfiler,
+    merge_profiles,
+    clear_profiles,
+    build_run_report,
+    compare_run_reports,
+    load_run_report,
+    save_run_report,
+    peak_rss_mb,
+    STAGE_INPUTS,
+    parse_stages,
+    with_overriding_stages,
+    invalidate_overrides,
+    input_fingerprints,
+    store_fingerprints,
+    pipeline_view,
+    changed_sentences,
+    load_sentence_records
 )
 
 agent = {} # Dictionary to hold all agents
+profiler = StageProfiler() # Replaced in each worker, disabled unless profiling is requested
+usage = None # LLMUsageCounter of each worker, for the run report
+
+# Order in which the agents run on each file (after passive detection)
+PIPELINE_STAGES = [
+    'context_retriever',
+    'deduce_agent',
+    'agent_inferencer',
+    'mystification_classifier',
+    'agent_classifier',
+    'verifier'
+]
+
+FILES_PER_TASK = 4 # Files sent to a worker at once, so that spaCy can work on the next file while the LLM stages run
+PREFETCH_FILES = 2 # Parsed files waiting for the LLM stages inside a worker (bounds memory)
 
-def load_document() -> str:
+def load_deducable_agent_map() -> dict:
     """
-    Load the deducable agents list from directory (if available) and the corpus from directory.
+    Load the deducable agents list from directory (if available).
     """
-    # 1. Load deducable agent list (if available)
     try:
         deducable_agent_list_path = input("Enter deducable agents list file path (or press Enter to skip): ").strip()
         deducable_agent_map = {}
@@ -56,6 +84,15 @@ def load_document() -> str:
             print(f"Loaded deducable agents: {len(deducable_agent_map)} entries\n")
     except FileNotFoundError:
         print("There is no 'deducable_agents' file. We will skip this.\n")
+    return deducable_agent_map
+
+def load_document(segmenter="regex") -> str:
+    """
+    Load the deducable agents list from directory (if available) and the corpus from directory.
+    :param segmenter: 'regex' for the built-in sentence splitter, 'senter' for spaCy's statistical sentence segmenter.
+    """
+    # 1. Load deducable agent list (if available)
+    deducable_agent_map = load_deducable_agent_map()
 
     # 2. Load corpus from directory
     corpus_path = input("Enter corpra input directory: ").strip()
@@ -63,7 +100,7 @@ def load_document() -> str:
         print(f"Invalid directory path: {corpus_path}\n")
         return
     print(f"Reading files from: {corpus_path}")
-    sentences_dict = read_txt_files_to_sentences_dict(corpus_path)
+    sentences_dict = read_txt_files_to_sentences_dict(corpus_path, nlp=load_senter() if segmenter == "senter" else None)
     if not sentences_dict:
         print("No text files found or files were empty in the specified directory.")
         return
@@ -71,13 +108,30 @@ def load_document() -> str:
 
     return sentences_dict, deducable_agent_map
 
-def initialize_agent():
+def initialize_agent(llm_callbacks=None, context_mode="summary", fake_llm_latency=None, verify_thresholds=(0.35, 0.85), verify_audit_rate=0.1):
     """
     Initialize all necessary components and agents for the pipeline.
+    :param llm_callbacks: Optional Langchain callback handlers attached to the language model (e.g. LLMUsageCounter).
+    :param context_mode: 'summary', 'index' or 'both', see ContextRetrieverAgent.
+    :param fake_llm_latency: If set, use FakeLabelChatModel with this latency (seconds per call) instead of the LLM server.
+    :param verify_thresholds: (lower, upper) similarity thresholds of the verifier pre-check, see VerifierAgent.
+    :param verify_audit_rate: Fraction of pre-checked sentences also sent to the LLM, see VerifierAgent.
     """    
+    # PassivePy and the language model are imported here so that workers and --help do not pay for them at import time
+    try:
+        from PassivePySrc import PassivePy
+    except ImportError as e:
+        print(f"Cannot import PassivePy: {e}\n")
+        return
+    # from langchain_community.chat_models import ChatOpenAI # Uncomment if using OpenAI
+    from langchain_community.chat_models import ChatOllama
+
     # 1. Initialize PassivePy
     try:
         passivepy = PassivePy.PassivePyAnalyzer(spacy_model = "en_core_web_lg")
+        # PassivePy loads its pipeline with NER disabled, the context retriever needs it for the entity lists
+        if "ner" in passivepy.nlp.disabled:
+            passivepy.nlp.enable_pipe("ner")
         print(f"Loaded PassivePy model: {passivepy}\n")
     except Exception as e:
         print(f"Failed to load PassivePy. {e}\n")
@@ -92,8 +146,13 @@ def initialize_agent():
 
     # 3. Initialize LLM model (adjust if needed)
     try:
-        llm_model = ChatOllama(model="llama3.1:8b", temperature=0.1, base_url="http://localhost:11434") # example for Ollama, for openAI, an API key parameter is needed
-        print(f"Loaded language model: {llm_model.model}\n")
+        if fake_llm_latency is not None:
+            from modules.fake_llm import FakeLabelChatModel
+            llm_model = FakeLabelChatModel(latency=fake_llm_latency, callbacks=llm_callbacks)
+            print(f"Loaded fake language model ({fake_llm_latency}s per call)\n")
+        else:
+            llm_model = ChatOllama(model="llama3.1:8b", temperature=0.1, base_url="http://localhost:11434", callbacks=llm_callbacks) # example for Ollama, for openAI, an API key parameter is needed
+            print(f"Loaded language model: {llm_model.model}\n")
     except Exception as e:
         print(f"Failed to load language model. {e}\n")
         return
@@ -101,66 +160,528 @@ def initialize_agent():
     # 4. Initialize agents
     try:
         agent['passive_detector'] = PassiveDetectorAgent(passivepy_instance=passivepy)
-        agent['context_retriever'] = ContextRetrieverAgent(llm=llm_model, window_size=5)
+        agent['context_retriever'] = ContextRetrieverAgent(llm=llm_model, window_size=5, nlp=passivepy.nlp, context_mode=context_mode, top_k=5)
         agent['deduce_agent'] = DeducibleAgent(llm=llm_model)
         agent['agent_inferencer'] = AgentInferenceAgent(llm=llm_model)
         agent['mystification_classifier'] = MystificationClassifierAgent(llm=llm_model)
         agent['agent_classifier'] = AgentClassifierAgent(llm=llm_model, passivepy_analyzer=passivepy)
-        agent['verifier'] = VerifierAgent(llm=llm_model)
+        agent['verifier'] = VerifierAgent(llm=llm_model, nlp=passivepy.nlp, similarity_thresholds=verify_thresholds, audit_rate=verify_audit_rate)
         agent['annotator'] = AnnotatorAgent()
         print("Loaded all agents.\n")
     except Exception as e:
         print(f"Failed to initialize agents. {e}\n")
         return
 
+def initialize_worker(profile_dir=None, agent_options=None):
+    """
+    Pool initializer: set up the (optional) profiler and the LLM call counter of this worker, then load the agents.
+    :param agent_options: keyword arguments of initialize_agent (context_mode, fake_llm_latency, ...).
+    """
+    from modules import LLMUsageCounter
+
+    global profiler, usage
+    profiler = StageProfiler(profile_dir)
+    usage = LLMUsageCounter()
+    with profiler.stage('initialize'):
+        initialize_agent(llm_callbacks=[usage], **(agent_options or {}))
+    profiler.dump()
+
+def worker_stats():
+    """
+    Statistics of this worker for the run report: stage durations since the previous task,
+    LLM calls and peak RSS so far.
+    """
+    return {
+        'worker': profiler.worker_id,
+        'stage_seconds': profiler.pop_timings(),
+        'llm_calls': usage.snapshot()['calls'] if usage else 0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def stage_prompt_key(stage_name, deducable_agent_map):
+    """
+    Everything besides the sentence fields that determines a stage's answers: its prompt (and the verb list,
+    or the pre-check thresholds and audit rate of the verifier).
+    """
+    prompt_key = getattr(agent[stage_name], 'template', '')
+    if stage_name == 'deduce_agent':
+        prompt_key += json.dumps(deducable_agent_map, sort_keys=True)
+    elif stage_name == 'verifier':
+        verifier = agent[stage_name]
+        prompt_key += json.dumps([verifier.lower_threshold, verifier.upper_threshold, verifier.audit_rate])
+    return prompt_key
+
+def run_stage(stage_name, sentences_dict, deducable_agent_map):
+    """
+    Run a single agent stage, wrapped by the worker's profiler.
+    The inputs of re-runnable stages are fingerprinted first and the fingerprints kept for the sentences the
+    stage answered, so that --rerun can skip unchanged sentences and retry failed ones.
+    """
+    pending = []
+    if stage_name in STAGE_INPUTS:
+        pending = input_fingerprints(stage_name, sentences_dict, stage_prompt_key(stage_name, deducable_agent_map))
+    with profiler.stage(stage_name):
+        if stage_name == 'deduce_agent':
+            sentences_dict = agent[stage_name].run(sentences_dict, deducible_agent_map=deducable_agent_map)
+        else:
+            sentences_dict = agent[stage_name].run(sentences_dict)
+    if pending:
+        store_fingerprints(stage_name, pending)
+    return sentences_dict
+
 def demystify(file_item, deducable_agent_map):
     
     filename, sentences = file_item
     single_file_dict = {filename: sentences}
 
-    sentences_dict = agent['passive_detector'].run(single_file_dict)
+    sentences_dict = run_stage('passive_detector', single_file_dict, deducable_agent_map)
     if not sentences_dict:
         print("No passive sentences to process. Exit now.\n")
         return filename, {}
     
-    sentences_dict = agent['context_retriever'].run(sentences_dict)
-    sentences_dict = agent['deduce_agent'].run(sentences_dict, deducible_agent_map=deducable_agent_map)
-    sentences_dict = agent['agent_inferencer'].run(sentences_dict)
-    sentences_dict = agent['mystification_classifier'].run(sentences_dict)
-    sentences_dict = agent['agent_classifier'].run(sentences_dict)
-    sentences_dict = agent['verifier'].run(sentences_dict)
+    for stage_name in PIPELINE_STAGES:
+        sentences_dict = run_stage(stage_name, sentences_dict, deducable_agent_map)
+    profiler.dump()
 
     return filename, sentences_dict.get(filename, {})
 
-def run_pipeline():
-    sentences_dict, deducable_agent_map = load_document()
+def demystify_files(file_items, deducable_agent_map):
+    """
+    Process several files with the spaCy and LLM work overlapped: a producer thread runs passive detection and
+    context preparation (batched nlp.pipe) on the next files, while this thread runs the LLM stages on the
+    current one. The two are connected by a bounded queue of PREFETCH_FILES parsed files; files that are
+    parsed by the time the LLM is free again go through the LLM stages together.
+    Only the producer runs passivepy.nlp: the co-texts are parsed for the verifier in context preparation, and the
+    verifier on this thread only reads the shared word vector table.
+    """
+    if profiler.enabled:
+        # cProfile and tracemalloc cannot attribute work to two concurrent threads, keep the stages sequential
+        return [demystify(file_item, deducable_agent_map) for file_item in file_items]
+
+    parsed_files = queue.Queue(maxsize=PREFETCH_FILES)
+    stop = threading.Event() # set when this thread stops taking files, e.g. because an LLM stage raised
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                parsed_files.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        for filename, sentences in file_items:
+            try:
+                sentences_dict = run_stage('passive_detector', {filename: sentences}, deducable_agent_map)
+                with profiler.stage('context_prepare'):
+                    sentences_dict = agent['context_retriever'].prepare(sentences_dict)
+                item = (filename, sentences_dict, None)
+            except Exception as e:
+                item = (filename, None, e)
+            if not put(item):
+                return
+        put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    results = []
+    finished = False
+    try:
+        while not finished:
+            # Take every file that is already parsed, so that the requests of each agent for all of them
+            # reach the LLM server back to back and share its cached prompt prefix.
+            ready = [parsed_files.get()]
+            while True:
+                try:
+                    ready.append(parsed_files.get_nowait())
+                except queue.Empty:
+                    break
+
+            sentences_dict = {}
+            for item in ready:
+                if item is None:
+                    finished = True
+                    continue
+                filename, parsed_dict, error = item
+                if error is not None:
+                    print(f"Error during passive detection in file '{filename}': {error}")
+                    results.append((filename, {}))
+                    continue
+                sentences_dict.update(parsed_dict)
+            if not sentences_dict:
+                continue
+
+            with profiler.stage('context_retriever'):
+                sentences_dict = agent['context_retriever'].summarize(sentences_dict)
+            for stage_name in PIPELINE_STAGES[1:]:
+                sentences_dict = run_stage(stage_name, sentences_dict, deducable_agent_map)
+            results.extend((filename, processed_sentences) for filename, processed_sentences in sentences_dict.items())
+    finally:
+        # Release a producer blocked on the full queue and wait for it, also when a stage raised
+        stop.set()
+        while True:
+            try:
+                parsed_files.get_nowait()
+            except queue.Empty:
+                break
+        producer.join()
+
+    return results
+
+def run_task(file_items, deducable_agent_map):
+    """
+    Pool task: demystify a chunk of files and return the results with the worker's statistics.
+    """
+    return demystify_files(file_items, deducable_agent_map), worker_stats()
+
+def rerun_file(file_item, stage_names, deducable_agent_map):
+    """
+    Run the selected stages on the stored records of one file, only for sentences whose inputs changed.
+    Sentences recomputed by a stage are recomputed by the stages overriding its output as well.
+    """
+    filename, sentences = file_item
+    recomputed = {}
+    for stage_name in stage_names:
+        changed = changed_sentences(stage_name, sentences, stage_prompt_key(stage_name, deducable_agent_map))
+        recomputed[stage_name] = len(changed)
+        if changed:
+            with pipeline_view(stage_name, changed):
+                run_stage(stage_name, {filename: changed}, deducable_agent_map)
+            invalidate_overrides(stage_name, changed)
+    profiler.dump()
+
+    return filename, sentences, recomputed
+
+def save_json_output(final_sentences_dict):
+    print("...Running annotator...\n")
+    annotator = AnnotatorAgent()
+    output = annotator.run(final_sentences_dict)
+    with open("output.json", 'w', encoding='utf-8') as f:
+        f.write(output)
+    print("output.json saved.\n")
+
+def run_pipeline(profile_dir=None, output_format="json", partition_by="file", num_workers=4, segmenter="regex", agent_options=None,
+                 report_path="run_report.json"):
+    agent_options = agent_options or {}
+    sentences_dict, deducable_agent_map = load_document(segmenter)
     num_files = len(sentences_dict)
-    num_cores = 4
+    num_sentences = sum(len(sentences) for sentences in sentences_dict.values())
+    num_cores = num_workers
     print(f"Processing with {num_cores} cores...\n")
     start_time = time.time()
 
-    tasks = sentences_dict.items()
-    agent_func = partial(demystify, deducable_agent_map=deducable_agent_map)
+    file_items = list(sentences_dict.items())
+    tasks = [file_items[i:i + FILES_PER_TASK] for i in range(0, num_files, FILES_PER_TASK)]
+    agent_func = partial(run_task, deducable_agent_map=deducable_agent_map)
+
+    parquet_annotator = None
+    if output_format == "parquet":
+        try:
+            parquet_annotator = ParquetAnnotatorAgent("output_parquet", partition_by=partition_by)
+        except (ImportError, ValueError) as e:
+            print(f"Cannot write the Parquet output: {e}\n")
+            return
 
     final_sentences_dict = {}
-    with multiprocessing.Pool(processes=num_cores, initializer=initialize_agent) as pool:
-        for filename, processed_sentences in tqdm(pool.imap_unordered(agent_func, tasks), total=num_files, desc="Processing files"):
-            if processed_sentences:
-                final_sentences_dict[filename] = processed_sentences
+    stage_seconds = {}
+    workers = {}
+    if profile_dir:
+        clear_profiles(profile_dir)
+        print(f"Profiling enabled, writing reports to: {profile_dir}\n")
+
+    with multiprocessing.Pool(processes=num_cores, initializer=initialize_worker, initargs=(profile_dir, agent_options)) as pool:
+        progress = tqdm(total=num_files, desc="Processing files")
+        for results, stats in pool.imap_unordered(agent_func, tasks):
+            for stage_name, durations in stats['stage_seconds'].items():
+                stage_seconds.setdefault(stage_name, []).extend(durations)
+            # LLM calls and peak RSS are running totals of the worker, keep the latest
+            workers[stats['worker']] = {'llm_calls': stats['llm_calls'], 'peak_rss_mb': stats['peak_rss_mb']}
+            for filename, processed_sentences in results:
+                if processed_sentences:
+                    final_sentences_dict[filename] = processed_sentences
+                    if parquet_annotator:
+                        parquet_annotator.write(filename, processed_sentences)
+            progress.update(len(results))
+        progress.close()
     
     print("Done.\n")
     end_time = time.time()
     print(f"Total processing time: {end_time - start_time:.2f} seconds\n")
 
-    print("...Running annotator...\n")
-    annotator = AnnotatorAgent()
-    output = annotator.run(final_sentences_dict)
-    with open("output.json", 'w', encoding='utf-8') as f:
-        f.write(output)
-    print("output.json saved.\n")
+    num_passives = sum(
+        1 for sentences in final_sentences_dict.values() for sentence_data in sentences
+        if isinstance(sentence_data, dict) and sentence_data.get('voice_type') in ['1', '2']
+    )
+    report = build_run_report(num_files, num_sentences, num_passives, end_time - start_time, stage_seconds, workers, config={
+        'workers': num_workers,
+        'files_per_task': FILES_PER_TASK,
+        'segmenter': segmenter,
+        'context_mode': agent_options.get('context_mode', "summary"),
+        'output_format': output_format,
+        'llm': f"fake ({agent_options['fake_llm_latency']}s per call)" if agent_options.get('fake_llm_latency') is not None else "llama3.1:8b",
+    })
+    save_run_report(report, report_path)
+    print(f"Throughput: {report['sentences_per_sec'] or 0:.1f} sentences/s, {report['passives_per_sec'] or 0:.1f} passive sentences/s, "
+          f"{report['llm_calls_per_passive'] or 0:.2f} LLM calls per passive sentence")
+    print(f"Run report saved to: {report_path}\n")
+
+    if profile_dir:
+        report_path = merge_profiles(profile_dir)
+        print(f"Profile report saved to: {report_path}\n")
+
+    audited, agreement = VerifierAgent.agreement_rate(final_sentences_dict)
+    if agreement is not None:
+        print(f"Verifier pre-check agreement with LLM: {agreement:.2%} ({audited} audited sentences)\n")
+
+    if parquet_annotator:
+        parquet_annotator.close()
+        print("output_parquet/ saved.\n")
+    else:
+        save_json_output(final_sentences_dict)
+
+def run_rerun(previous_output, stages_str, profile_dir=None, output_format="json", partition_by="file", num_workers=4, agent_options=None):
+    """
+    Re-run only the selected stages on the records of a previous run (output.json or a Parquet dataset).
+    Upstream fields are reused and only sentences whose inputs to a stage changed are recomputed.
+    """
+    try:
+        stage_names = parse_stages(stages_str)
+    except ValueError as e:
+        print(f"{e}\n")
+        return
+    if not stage_names:
+        print("No stages selected. Use --stages, e.g. --stages verifier,mystification\n")
+        return
+    overriding = [stage_name for stage_name in with_overriding_stages(stage_names) if stage_name not in stage_names]
+    if overriding:
+        # e.g. the verifier overwrites agent_status and mystification_idx of sentences without a guessed agent
+        print(f"Also re-running {', '.join(overriding)}, since it overwrites the output of the selected stages.\n")
+        stage_names = with_overriding_stages(stage_names)
+
+    try:
+        sentences_dict = load_sentence_records(previous_output)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load previous output '{previous_output}': {e}\n")
+        return
+    print(f"Loaded {sum(len(s) for s in sentences_dict.values())} passive sentences from {len(sentences_dict)} file(s)\n")
+
+    deducable_agent_map = load_deducable_agent_map() if 'deduce_agent' in stage_names else {}
+    print(f"Re-running {', '.join(stage_names)} with {num_workers} cores...\n")
+    start_time = time.time()
+
+    agent_func = partial(rerun_file, stage_names=stage_names, deducable_agent_map=deducable_agent_map)
+    final_sentences_dict = {}
+    recomputed_total = dict.fromkeys(stage_names, 0)
+    if profile_dir:
+        clear_profiles(profile_dir)
+    with multiprocessing.Pool(processes=num_workers, initializer=initialize_worker, initargs=(profile_dir, agent_options)) as pool:
+        for filename, sentences, recomputed in tqdm(pool.imap_unordered(agent_func, sentences_dict.items()), total=len(sentences_dict), desc="Re-running files"):
+            final_sentences_dict[filename] = sentences
+            for stage_name, count in recomputed.items():
+                recomputed_total[stage_name] += count
+
+    print("Done.\n")
+    print(f"Total processing time: {time.time() - start_time:.2f} seconds\n")
+    for stage_name, count in recomputed_total.items():
+        print(f"{stage_name}: recomputed {count} sentence(s)")
+    print()
+
+    if profile_dir:
+        report_path = merge_profiles(profile_dir)
+        print(f"Profile report saved to: {report_path}\n")
+
+    if output_format == "parquet":
+        try:
+            ParquetAnnotatorAgent("output_parquet", partition_by=partition_by).run(final_sentences_dict)
+        except (ImportError, ValueError) as e:
+            print(f"Cannot write the Parquet output: {e}\n")
+            return
+        print("output_parquet/ saved.\n")
+    else:
+        save_json_output(final_sentences_dict)
+
+def run_estimate(num_workers=4, sample_fraction=0.05, sample_sentences=200, llm_sample_files=3, segmenter="regex", agent_options=None):
+    """
+    Dry run: estimate the passive rates, LLM calls, tokens, wall-clock time and label distribution of a full run
+    from a stratified sample of the corpus. Nothing is written except estimate.json.
+    """
+    from modules import LLMUsageCounter, stratified_sample, project_run
+
+    sentences_dict, deducable_agent_map = load_document(segmenter)
+    total_sentences = sum(len(sentences) for sentences in sentences_dict.values())
+
+    usage = LLMUsageCounter()
+    initialize_agent(llm_callbacks=[usage], **(agent_options or {}))
+    if 'verifier' not in agent:
+        print("Agents could not be loaded, cannot estimate.\n")
+        return
+
+    # 1. Passive and truncated-passive rates on a stratified sample
+    sample = stratified_sample(sentences_dict, fraction=sample_fraction, sentences_per_file=sample_sentences)
+    start_time = time.perf_counter()
+    detected = run_stage('passive_detector', sample, deducable_agent_map)
+    voice_types = [entry[1] for entries in detected.values() for entry in entries]
+    detection = {
+        'sentences': len(voice_types),
+        'full': voice_types.count('1'),
+        'truncated': voice_types.count('2'),
+        'seconds': time.perf_counter() - start_time,
+    }
+    print(f"Detected {detection['full']} full and {detection['truncated']} truncated passives in {detection['sentences']} sampled sentences "
+          f"from {len(sample)} file(s).\n")
+
+    # 2. Per-call cost of the LLM agents on a few of the sampled files
+    subset_names = random.Random(0).sample(list(detected), min(llm_sample_files, len(detected)))
+    subset = {name: detected[name] for name in subset_names}
+    subset_voice_types = [entry[1] for name in subset_names for entry in subset[name]]
+    units = {
+        'passive': sum(v in ['1', '2'] for v in subset_voice_types),
+        'truncated': subset_voice_types.count('2'),
+    }
+
+    stages = {}
+    for stage_name in tqdm(PIPELINE_STAGES, desc="Measuring LLM stages"):
+        before = usage.snapshot()
+        start_time = time.perf_counter()
+        subset = run_stage(stage_name, subset, deducable_agent_map)
+        seconds = time.perf_counter() - start_time
+        after = usage.snapshot()
+        unit = 'passive' if stage_name == 'context_retriever' else 'truncated'
+        stages[stage_name] = {
+            'unit': unit,
+            'units': units[unit],
+            'seconds': seconds,
+            'calls': after['calls'] - before['calls'],
+            'llm_seconds': after['seconds'] - before['seconds'],
+            'prompt_tokens': after['prompt_tokens'] - before['prompt_tokens'],
+            'completion_tokens': after['completion_tokens'] - before['completion_tokens'],
+        }
+
+    mystification_counts = {}
+    for sentences in subset.values():
+        for sentence_data in sentences:
+            if sentence_data.get('voice_type') in ['1', '2']:
+                label = sentence_data.get('mystification_idx', 'NA')
+                mystification_counts[label] = mystification_counts.get(label, 0) + 1
+
+    estimate = project_run(total_sentences, detection, stages, mystification_counts, num_workers)
+    with open("estimate.json", 'w', encoding='utf-8') as f:
+        json.dump(estimate, f, indent=4)
+
+    print(f"Corpus: {len(sentences_dict)} file(s), {total_sentences} sentences")
+    print(f"Passive rate: {estimate['passive_rate']['value']:.2%} (95% CI {estimate['passive_rate']['ci95'][0]:.2%} - {estimate['passive_rate']['ci95'][1]:.2%}), "
+          f"truncated: {estimate['truncated_passive_rate']['value']:.2%}")
+    print(f"Projected LLM calls: {estimate['projected_llm_calls']:.0f}, "
+          f"tokens: {estimate['projected_prompt_tokens']:.0f} prompt / {estimate['projected_completion_tokens']:.0f} completion")
+    print(f"Projected wall-clock time with {num_workers} worker(s): {estimate['projected_wall_clock_seconds'] / 3600:.1f} hours")
+    for stage_name, stage in estimate['stages'].items():
+        if stage['seconds_per_call'] is not None:
+            print(f"{stage_name}: {stage['seconds_per_call']:.2f} s per LLM call")
+    for label, share in estimate['mystification_idx_shares'].items():
+        print(f"mystification_idx {label}: {share['share']:.1%} (95% CI {share['ci95'][0]:.1%} - {share['ci95'][1]:.1%})")
+    print("\nestimate.json saved.\n")
+
+def run_compare(baseline_path, current_path, max_regression=0.10) -> int:
+    """
+    Compare two run reports and print every metric.
+    :return: exit status, 1 if a metric regressed by more than max_regression, else 0.
+    """
+    try:
+        baseline = load_run_report(baseline_path)
+        current = load_run_report(current_path)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load run reports: {e}\n")
+        return 2
+
+    regressions = 0
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, baseline_value, current_value, change, regressed in compare_run_reports(baseline, current, max_regression):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        if current_value is None:
+            print(f"{metric:<40} {baseline_value:>12.4g} {'missing':>12} {'':>8}{flag}")
+            continue
+        print(f"{metric:<40} {baseline_value:>12.4g} {current_value:>12.4g} {-change:>+8.1%}{flag}")
+    if regressions:
+        print(f"\n{regressions} metric(s) regressed by more than {max_regression:.0%}.\n")
+        return 1
+    print(f"\nNo regression above {max_regression:.0%}.\n")
+    return 0
+
+def parse_thresholds(value: str) -> tuple:
+    """
+    Parse 'LOW,HIGH' similarity thresholds for --verify-thresholds.
+    """
+    try:
+        lower, upper = (float(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected LOW,HIGH (e.g. 0.35,0.85), got '{value}'")
+    if not -1.0 <= lower <= upper <= 1.0:
+        raise argparse.ArgumentTypeError(f"expected -1 <= LOW <= HIGH <= 1, got '{value}'")
+    return lower, upper
 
-    f.close()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Demystify passive-voice sentences in a corpus.")
+    parser.add_argument("--profile", metavar="DIR", default=os.environ.get("DEMYSTIFY_PROFILE"),
+                        help="profile every agent stage in every worker (cProfile + tracemalloc) and write the reports to DIR "
+                             "(default: $DEMYSTIFY_PROFILE, disabled if unset)")
+    parser.add_argument("--output-format", choices=["json", "parquet"], default="json",
+                        help="write output.json (default) or a Parquet dataset to output_parquet/, streamed as files finish")
+    parser.add_argument("--partition-by", choices=["file", "shard"], default="file",
+                        help="partitioning of the Parquet dataset: one partition per input file, or hashed shards")
+    parser.add_argument("--segmenter", choices=["regex", "senter"], default="regex",
+                        help="sentence splitting: built-in regex splitter (default) or spaCy's senter component in batch mode")
+    parser.add_argument("--context", choices=["summary", "index", "both"], default="summary",
+                        help="context of passive sentences: LLM summary of the window (default), the most similar earlier "
+                             "sentences from a per-document vector index (no LLM call), or a summary of both")
+    parser.add_argument("--verify-thresholds", metavar="LOW,HIGH", type=parse_thresholds,
+                        default=os.environ.get("DEMYSTIFY_VERIFY_THRESHOLDS", "0.35,0.85"),
+                        help="similarity thresholds of the verifier pre-check: a guessed agent is verified 'yes' at or above HIGH and 'no' "
+                             "below LOW without the LLM (default: $DEMYSTIFY_VERIFY_THRESHOLDS or 0.35,0.85)")
+    parser.add_argument("--verify-audit-rate", type=float, default=os.environ.get("DEMYSTIFY_VERIFY_AUDIT_RATE", "0.1"),
+                        help="fraction of pre-checked sentences also sent to the LLM to measure agreement "
+                             "(default: $DEMYSTIFY_VERIFY_AUDIT_RATE or 0.1)")
+    parser.add_argument("--workers", type=int, default=4, help="number of worker processes (default: 4)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="dry run: project LLM calls, tokens, wall-clock time and label shares from a sample, then exit")
+    parser.add_argument("--sample-fraction", type=float, default=0.05, help="fraction of files sampled per length stratum in --estimate")
+    parser.add_argument("--sample-sentences", type=int, default=200, help="sentences taken from each sampled file in --estimate")
+    parser.add_argument("--llm-sample-files", type=int, default=3, help="sampled files run through the LLM agents in --estimate")
+    parser.add_argument("--rerun", metavar="PATH",
+                        help="load a previous output.json or Parquet dataset and re-run only the --stages on it")
+    parser.add_argument("--stages", default="",
+                        help="comma separated stages for --rerun: deducible, inference, mystification, classifier, verifier")
+    parser.add_argument("--report", metavar="PATH", default="run_report.json",
+                        help="where the run writes its throughput report (default: run_report.json)")
+    parser.add_argument("--fake-llm", metavar="SECONDS", type=float,
+                        help="replace the LLM with a deterministic fake answering after SECONDS, for repeatable performance runs")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two run reports and exit with status 1 if a metric regressed by more than --max-regression")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="largest accepted relative regression for --compare (default: 0.10)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     multiprocessing.set_start_method('spawn', force=True)
-    run_pipeline()
\ No newline at end of file
+    agent_options = {
+        'context_mode': args.context,
+        'fake_llm_latency': args.fake_llm,
+        'verify_thresholds': args.verify_thresholds,
+        'verify_audit_rate': args.verify_audit_rate,
+    }
+    if args.compare:
+        sys.exit(run_compare(*args.compare, max_regression=args.max_regression))
+    elif args.estimate:
+        run_estimate(num_workers=args.workers, sample_fraction=args.sample_fraction,
+                     sample_sentences=args.sample_sentences, llm_sample_files=args.llm_sample_files, segmenter=args.segmenter,
+                     agent_options=agent_options)
+    elif args.rerun:
+        run_rerun(args.rerun, args.stages, profile_dir=args.profile, output_format=args.output_format,
+                  partition_by=args.partition_by, num_workers=args.workers, agent_options=agent_options)
+    else:
+        run_pipeline(profile_dir=args.profile, output_format=args.output_format, partition_by=args.partition_by,
+                     num_workers=args.workers, segmenter=args.segmenter, agent_options=agent_options,
+                     report_path=args.report)
\ No newline at end of file
@@ -1,25 +1,68 @@
-from .utils import split_text_into_sentences, read_txt_files_to_sentences_dict, get_passive_subject, convert_passive_verb_to_active, extract_entity
-from .passive_detect_agent import PassiveDetectorAgent
-from .context_agent import ContextRetrieverAgent
-from .inference_agent import AgentInferenceAgent
-from .index_agent import MystificationClassifierAgent
-from .classify_agent import AgentClassifierAgent
-from .verify_agent import VerifierAgent
-from .annotator_agent import AnnotatorAgent
-from .deducible_agent import DeducibleAgent
+"""
+Agents of the de-mystification pipeline.
+Names are imported lazily (PEP 562) so that importing the package does not load spaCy or Langchain;
+the agents themselves import their heavy dependencies when they are constructed.
+"""
+import importlib
 
-__all__ = [
-    "split_text_into_sentences",
-    "read_txt_files_to_sentences_dict",
-    "get_passive_subject",
-    "convert_passive_verb_to_active",
-    "extract_entity",
-    "PassiveDetectorAgent",
-    "ContextRetrieverAgent",
-    "AgentInferenceAgent",
-    "MystificationClassifierAgent",
-    "AgentClassifierAgent",
-    "VerifierAgent",
-    "AnnotatorAgent",
-    "DeducibleAgent"
-]
\ No newline at end of file
+_EXPORTS = {
+    "split_text_into_sentences": ".utils",
+    "read_txt_files_to_sentences_dict": ".utils",
+    "read_txt_files_to_segments": ".utils",
+    "segment_text": ".utils",
+    "segment_texts": ".utils",
+    "load_senter": ".utils",
+    "get_passive_subject": ".utils",
+    "convert_passive_verb_to_active": ".utils",
+    "extract_entity": ".utils",
+    "extract_entities": ".utils",
+    "analyze_co_texts": ".utils",
+    "PassiveDetectorAgent": ".passive_detect_agent",
+    "ContextRetrieverAgent": ".context_agent",
+    "AgentInferenceAgent": ".inference_agent",
+    "MystificationClassifierAgent": ".index_agent",
+    "AgentClassifierAgent": ".classify_agent",
+    "VerifierAgent": ".verify_agent",
+    "AnnotatorAgent": ".annotator_agent",
+    "ParquetAnnotatorAgent": ".annotator_agent",
+    "read_passives": ".annotator_agent",
+    "read_passive_records": ".annotator_agent",
+    "DeducibleAgent": ".deducible_agent",
+    "LabelChain": ".label_decoding",
+    "normalize_label": ".label_decoding",
+    "StageProfiler": ".profiler",
+    "merge_profiles": ".profiler",
+    "clear_profiles": ".profiler",
+    "LLMUsageCounter": ".estimator",
+    "stratified_sample": ".estimator",
+    "wilson_interval": ".estimator",
+    "project_run": ".estimator",
+    "STAGE_INPUTS": ".stages",
+    "parse_stages": ".stages",
+    "with_overriding_stages": ".stages",
+    "invalidate_overrides": ".stages",
+    "input_fingerprints": ".stages",
+    "store_fingerprints": ".stages",
+    "pipeline_view": ".stages",
+    "changed_sentences": ".stages",
+    "load_sentence_records": ".stages",
+    "FakeLabelChatModel": ".fake_llm",
+    "build_run_report": ".run_report",
+    "compare_run_reports": ".run_report",
+    "load_run_report": ".run_report",
+    "save_run_report": ".run_report",
+    "peak_rss_mb": ".run_report",
+    "percentile": ".run_report"
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,4 +1,8 @@
+import os
 import json
+import zlib
+import shutil
+from urllib.parse import quote
 
 class AnnotatorAgent:
     """
@@ -31,9 +35,9 @@ class AnnotatorAgent:
                 
                 voice_type = sentence_data.get('voice_type')
                 
-                # Filter for passive sentences
+                # Filter for passive sentences, without the private working fields of the agents (e.g. '_co_text_features')
                 if voice_type in ['1', '2']:
-                    filtered_passive_sentences_for_file.append(sentence_data)
+                    filtered_passive_sentences_for_file.append({key: value for key, value in sentence_data.items() if not key.startswith('_')})
             
             # Add the list of (only) passive sentences for this file to our output dictionary.
             # If a file has no passive sentences, it will be an empty list.
@@ -54,4 +58,202 @@ class AnnotatorAgent:
         except Exception as e:
             error_message = f"An unexpected error occurred during JSON serialization: {e}"
             print(f"Error: {error_message}")
-            return json.dumps({"error": error_message, "type": "UnexpectedSerializationError", "details": str(e)}, ensure_ascii=False, indent=indent)
\ No newline at end of file
+            return json.dumps({"error": error_message, "type": "UnexpectedSerializationError", "details": str(e)}, ensure_ascii=False, indent=indent)
+
+# Columns of the columnar export, in order. 'category' columns are dictionary-encoded, 'json' columns are JSON strings.
+PARQUET_COLUMNS = [
+    ("text", "string"),
+    ("voice_type", "category"),
+    ("verb_phrase", "string"),
+    ("explicit_agent", "string"),
+    ("co-text", "string"),
+    ("context", "string"),
+    ("retrieved_context", "string"),
+    ("entities", "list"),
+    ("deducible_agent", "list"),
+    ("guessed_agent", "string"),
+    ("agent_status", "category"),
+    ("mystification_idx", "category"),
+    ("agent_verification", "category"),
+    ("verification_precheck", "category"),
+    ("verification_source", "category"),
+    ("stage_fingerprints", "json"),
+]
+
+_JSON_COLUMNS = {name for name, kind in PARQUET_COLUMNS if kind == "json"}
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError(f"The Parquet export needs pyarrow (pip3 install pyarrow): {e}") from e
+    return pyarrow
+
+def _clear_dataset(output_dir: str):
+    """
+    Remove the partitions of an earlier dataset from output_dir.
+    :raise ValueError: if output_dir holds anything other than 'filename=' or 'shard=' partitions.
+    """
+    if not os.path.isdir(output_dir):
+        return
+    entries = os.listdir(output_dir)
+    foreign = [entry for entry in entries if not entry.startswith(("filename=", "shard="))]
+    if foreign:
+        raise ValueError(f"'{output_dir}' is not empty and not a Parquet output of the pipeline (found '{foreign[0]}'), "
+                         "remove it or choose another directory.")
+    for entry in entries:
+        shutil.rmtree(os.path.join(output_dir, entry))
+
+class ParquetAnnotatorAgent:
+    """
+    Agent to export passive sentences as a partitioned Parquet dataset (one row per passive sentence).
+    Results can be written file by file as they arrive; rows are buffered and flushed in row groups.
+    :param output_dir: Directory of the dataset.
+    :param partition_by: 'file' writes one partition per input file (filename=<name>/),
+                         'shard' hashes filenames into num_shards partitions (shard=<k>/) with a 'filename' column.
+    :param num_shards: Number of shards when partition_by is 'shard'.
+    :param row_group_size: Number of rows buffered per shard before a row group is written.
+    The partitions of a previous dataset in output_dir are removed first, so that none of its files (or of the
+    other partition layout) are mixed into the new one. Any other non-empty output_dir is refused with a ValueError.
+    """
+    def __init__(self, output_dir: str, partition_by: str = "file", num_shards: int = 16, row_group_size: int = 10000):
+        if partition_by not in ("file", "shard"):
+            raise ValueError(f"partition_by must be 'file' or 'shard', got '{partition_by}'.")
+        self.pa = _import_pyarrow()
+        self.output_dir = output_dir
+        self.partition_by = partition_by
+        self.num_shards = num_shards
+        self.row_group_size = row_group_size
+
+        self.category_type = self.pa.dictionary(self.pa.int32(), self.pa.string())
+        fields = [self.pa.field("filename", self.category_type)] if partition_by == "shard" else []
+        for name, kind in PARQUET_COLUMNS:
+            if kind == "category":
+                fields.append(self.pa.field(name, self.category_type))
+            elif kind == "list":
+                fields.append(self.pa.field(name, self.pa.list_(self.pa.string())))
+            else:
+                fields.append(self.pa.field(name, self.pa.string()))
+        self.schema = self.pa.schema(fields)
+
+        self._writers = {}
+        self._buffers = {}
+        _clear_dataset(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def run(self, sentences_dict: dict) -> str:
+        """
+        Export a whole sentences_dict and close the dataset.
+        :return: the dataset directory.
+        """
+        for filename, list_of_sentence_data_dicts in sentences_dict.items():
+            self.write(filename, list_of_sentence_data_dicts)
+        self.close()
+        return self.output_dir
+
+    def write(self, filename: str, list_of_sentence_data_dicts: list):
+        """
+        Add the passive sentences of one file to the dataset.
+        """
+        if not isinstance(list_of_sentence_data_dicts, list):
+            print(f"Warning: Expected a list of sentences for file '{filename}', but got {type(list_of_sentence_data_dicts)}. Skipping.")
+            return
+        rows = [s for s in list_of_sentence_data_dicts if isinstance(s, dict) and s.get('voice_type') in ['1', '2']]
+        if not rows:
+            return
+
+        if self.partition_by == "file":
+            table = self._to_table(filename, rows)
+            partition_dir = os.path.join(self.output_dir, f"filename={quote(filename, safe='')}")
+            os.makedirs(partition_dir, exist_ok=True)
+            self.pa.parquet.write_table(table, os.path.join(partition_dir, "part-0.parquet"), row_group_size=self.row_group_size)
+            return
+
+        shard = zlib.crc32(filename.encode('utf-8')) % self.num_shards
+        buffer = self._buffers.setdefault(shard, [])
+        buffer.append((filename, rows))
+        if sum(len(r) for _, r in buffer) >= self.row_group_size:
+            self._flush(shard)
+
+    def close(self):
+        """
+        Flush the remaining rows and close all open shard files.
+        """
+        for shard in list(self._buffers):
+            self._flush(shard)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def _flush(self, shard: int):
+        buffer = self._buffers.pop(shard, [])
+        if not buffer:
+            return
+        tables = [self._to_table(filename, rows) for filename, rows in buffer]
+        table = self.pa.concat_tables(tables).unify_dictionaries()
+        if shard not in self._writers:
+            shard_dir = os.path.join(self.output_dir, f"shard={shard}")
+            os.makedirs(shard_dir, exist_ok=True)
+            self._writers[shard] = self.pa.parquet.ParquetWriter(os.path.join(shard_dir, "part-0.parquet"), self.schema)
+        self._writers[shard].write_table(table, row_group_size=self.row_group_size)
+
+    def _to_table(self, filename: str, rows: list):
+        arrays = []
+        for field in self.schema:
+            if field.name == "filename":
+                values = [filename] * len(rows)
+            elif field.name in _JSON_COLUMNS:
+                values = [None if row.get(field.name) is None else json.dumps(row.get(field.name), ensure_ascii=False) for row in rows]
+            elif field.type == self.category_type or field.type == self.pa.string():
+                values = [None if row.get(field.name) is None else str(row.get(field.name)) for row in rows]
+            else:
+                values = [_as_string_list(row.get(field.name)) for row in rows]
+
+            if field.type == self.category_type:
+                arrays.append(self.pa.array(values, type=self.pa.string()).dictionary_encode())
+            else:
+                arrays.append(self.pa.array(values, type=field.type))
+        return self.pa.Table.from_arrays(arrays, schema=self.schema)
+
+def _as_string_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+def read_passives(dataset_dir: str, columns: list = None, filters=None):
+    """
+    Load an exported Parquet dataset into a pandas DataFrame, reading only the requested columns.
+    :param dataset_dir: Directory written by ParquetAnnotatorAgent.
+    :param columns: Columns to load (e.g. ['filename', 'mystification_idx']); all columns if None.
+    :param filters: Optional pyarrow.dataset expression, e.g. pyarrow.dataset.field('voice_type') == '2'.
+    :return: a pandas DataFrame; dictionary-encoded columns become pandas categoricals.
+    """
+    pa = _import_pyarrow()
+    # keep partition values as strings, filenames such as '001' must not be inferred as integers
+    partitioning = pa.dataset.HivePartitioning.discover(infer_dictionary=True)
+    dataset = pa.dataset.dataset(dataset_dir, format="parquet", partitioning=partitioning)
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+def read_passive_records(dataset_dir: str) -> dict:
+    """
+    Load an exported Parquet dataset back into the pipeline's layout.
+    :param dataset_dir: Directory written by ParquetAnnotatorAgent.
+    :return: Dictionary where keys are filenames and values are lists of sentence dictionaries.
+    """
+    pa = _import_pyarrow()
+    partitioning = pa.dataset.HivePartitioning.discover(infer_dictionary=True)
+    dataset = pa.dataset.dataset(dataset_dir, format="parquet", partitioning=partitioning)
+
+    sentences_dict = {}
+    for row in dataset.to_table().to_pylist():
+        filename = row.pop("filename")
+        row.pop("shard", None)
+        for name in _JSON_COLUMNS:
+            if row.get(name) is not None:
+                row[name] = json.loads(row[name])
+        sentences_dict.setdefault(filename, []).append(row)
+    return sentences_dict
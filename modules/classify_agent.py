@@ -1,7 +1,3 @@
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-
 from .utils import get_passive_subject, convert_passive_verb_to_active, get_agent_full_passive
 
 class AgentClassifierAgent:
@@ -17,11 +13,25 @@ class AgentClassifierAgent:
         :param passivepy_analyzer: An initialized instance of PassivePy.PassivePyAnalyzer.
         """
 
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
         self.llm = llm
         self.passivepy = passivepy_analyzer
 
-        prompt_str = (
+        # Invariant instructions go first (system message) so that the server can reuse the cached prompt prefix
+        system_str = (
             "You are an expert linguistic analyst. Your task is to identify doer of an action in a passive voice sentence.\n"
+            "You are given: 1. the TARGET PASSIVE SENTENCE, 2. the PASSIVE VERB PHRASE extracted from it, 3. a context summary, "
+            "4. a broader text window (the original sentence is its last sentence), 5. the list of entities in the co-text "
+            "and 6. a deducible agent list.\n"
+            "Based on all this information, decide who or what performs the action described by the verb phrase in the target sentence.\n"
+            "If the agent is present in the provided deducible agent list, LINK IT TO THE ENTITIES APPEARED IN THE PROVIDED ENTITIES LIST.\n"
+            "If none of the entities in the provided lists cannot possibly perform the given action, use common knowledge.\n"
+            "If the agent cannot be determined with reasonable certainty even with all the context and common knowledge, answer 'unknown'.\n\n"
+            "ANSWER WITH ONLY ONE AGENT OR UNKNOWN. DO NOT ADD ADDITIONAL TEXT OR REASONING."
+        )
+        prompt_str = (
             "1. TARGET PASSIVE SENTENCE: {target_sentence}\n"
             "2. Extracted PASSIVE VERB PHRASE from Target Sentence: {verb_phrase}\n"
             "3. Context: {context_summary}\n"
@@ -31,15 +41,11 @@ class AgentClassifierAgent:
             "   \"\"\"\n\n"
             "5. List of entities in the co-text: {entities_list}\n" \
             "6. Deducible agent list: {deducible_list}\n"
-            "Based on all the above information, who or what perform the action described by the verb phrase '{verb_phrase}'\n"
-            "in the target sentence '{target_sentence}'?\n"
-            "If the agent is present in the provided deducible agent list, LINK IT TO THE ENTITIES APPEARED IN THE PROVIDED ENTITIES LIST.\n"
-            "If none of the entities in the provided lists cannot possibly perform the given action, use common knowledge.\n"
-            "If the agent cannot be determined with reasonable certainty even with all the context and common knowledge, answer 'unknown'.\n\n"
-            "ANSWER WITH ONLY ONE AGENT OR UNKNOWN. DO NOT ADD ADDITIONAL TEXT OR REASONING.\n"
+            "Who or what perform the action described by the verb phrase '{verb_phrase}' in the target sentence '{target_sentence}'?\n"
             "Guessed Agent:"
         )
-        prompt = ChatPromptTemplate.from_template(prompt_str)
+        self.template = system_str + prompt_str
+        prompt = ChatPromptTemplate.from_messages([("system", system_str), ("human", prompt_str)])
         self.agent_guesser_chain = prompt | self.llm | StrOutputParser()
 
     def run(self, sentences_dict: dict) -> dict:
@@ -68,7 +74,12 @@ class AgentClassifierAgent:
                 if voice_type == '0': # Non-Passive
                     sentence_data['guessed_agent'] = "NA"
                 if voice_type == '1': # Full-Passive
-                    sentence_data['guessed_agent'] = get_agent_full_passive(sentence_data['text'])
+                    explicit_agent = sentence_data.get('explicit_agent')
+                    if explicit_agent and explicit_agent != "NA":
+                        # already extracted from the detection parse, no further NLP needed
+                        sentence_data['guessed_agent'] = explicit_agent
+                    else:
+                        sentence_data['guessed_agent'] = get_agent_full_passive(sentence_data['text'])
                 elif voice_type == '2':
                     llm_inputs = {
                         "target_sentence": sentence_data.get('text'),
@@ -1,8 +1,10 @@
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from __future__ import annotations
+from typing import TYPE_CHECKING
 
-from .utils import extract_entity
+if TYPE_CHECKING:
+    from langchain_core.language_models.llms import LLM
+
+from .utils import analyze_co_texts
 
 class ContextRetrieverAgent:
     """
@@ -10,36 +12,68 @@ class ContextRetrieverAgent:
     Default surrounding text (window_size) is set to be 5 sentences before the passive sentence.
     :param: llm: An instance of a language model (LLM) to use for summarization (e.g: ChatOpenAI, Ollama, ...).
     :param: window_size: Number of sentences to include before the current sentence for context.
+    :param: nlp: A loaded spaCy pipeline with word vectors, a parser and an active 'ner' component, used for entity
+                 extraction, the verifier's co-text features and retrieval (e.g. PassivePy's, with 'ner' enabled);
+                 en_core_web_lg is loaded if None.
+    :param: context_mode: How the 'context' of a passive sentence is built:
+                          'summary': LLM summary of the co-text window (default),
+                          'index': the top_k earlier sentences of the document most similar to the passive sentence
+                                   (outside the window), without any LLM call,
+                          'both': LLM summary of those retrieved sentences followed by the co-text window.
+    :param: top_k: Number of sentences retrieved per passive sentence in the 'index' and 'both' modes.
     :return: sentences_dict: the same dictionary as input but append the 'context' value to each 'text' value (if it is passive).
     """
-    def __init__(self, llm: LLM, window_size: int = 5):
+    def __init__(self, llm: LLM, window_size: int = 5, nlp=None, context_mode: str = "summary", top_k: int = 5):
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
         self.llm = llm
         self.window_size = window_size
+        self.nlp = nlp
+        if context_mode not in ("summary", "index", "both"):
+            raise ValueError(f"context_mode must be 'summary', 'index' or 'both', got '{context_mode}'.")
+        self.context_mode = context_mode
+        self.top_k = top_k
 
-        prompt_template_str = (
+        system_template_str = (
             "You are an expert at summarizing text.\n"
-            "Please provide a short, detailed summary of this entire context. FOCUS on the context of the last sentence.\n\n"
-            "ONLY ANSWER WITH THE SUMMARY. DO NOT ADD ANY ADDITIONAL THINKING EXCEPT FOR THE SUMMARY.\n\n"
+            "Please provide a short, detailed summary of the entire context given by the user. FOCUS on the context of the last sentence.\n\n"
+            "ONLY ANSWER WITH THE SUMMARY. DO NOT ADD ANY ADDITIONAL THINKING EXCEPT FOR THE SUMMARY."
+        )
+        prompt_template_str = (
             "Context Text:\n\"\"\"\n{context_text}\n\"\"\"\n\n"
             "Detailed Summary:"
         )
-        prompt_template = ChatPromptTemplate.from_template(prompt_template_str)
+        self.template = system_template_str + prompt_template_str
+        prompt_template = ChatPromptTemplate.from_messages([("system", system_template_str), ("human", prompt_template_str)])
         self.summarization_chain = prompt_template | self.llm | StrOutputParser()
 
     def run(self, sentences_dict: dict) -> dict:
+        return self.summarize(self.prepare(sentences_dict))
+
+    def prepare(self, sentences_dict: dict) -> dict:
+        """
+        CPU-only part of the agent: turn the detector's lists into sentence dictionaries, build the co-text
+        window of each passive sentence and parse it (one batched spaCy call per file) for its entities and for
+        the co-text features of the verifier pre-check, kept under the private '_co_text_features' key.
+        In the 'index' and 'both' modes, the earlier sentences most relevant to each passive sentence are retrieved here too.
+        No LLM calls are made, so this can run ahead of the LLM stages.
+        """
+        if self.nlp is None:
+            import spacy
+            self.nlp = spacy.load("en_core_web_lg")
+
         for filename, sentence_list_from_passive_detector in sentences_dict.items():
             # This new list will hold dictionaries instead of lists
             processed_file_entries = [] 
-
-            # batching attempt here
-            batch_inputs = []
-            sentences_to_update = []
+            passive_entries = []
 
             for i, sentence_entry in enumerate(sentence_list_from_passive_detector):
 
                 current_sentence_text = sentence_entry[0]
                 voice_type = sentence_entry[1]
                 verb_phrase_str = sentence_entry[2]
+                explicit_agent_str = sentence_entry[3] if len(sentence_entry) > 3 else "NA"
                 
                 # Initialize the dictionary for the current sentence.
                 # This will be the new structure for all sentences in the output.
@@ -47,6 +81,7 @@ class ContextRetrieverAgent:
                     'text': current_sentence_text,
                     'voice_type': voice_type,
                     'verb_phrase': verb_phrase_str,
+                    'explicit_agent': explicit_agent_str,  # agent of a full passive, taken from the detection parse
                     'co-text': None,  # Default co-text is None
                     'context': None,  # Default context is None
                     'entities': [],  # Initialize entities as an empty list
@@ -63,17 +98,74 @@ class ContextRetrieverAgent:
                     
                     context_texts_to_summarize = sentences_before_texts + [current_sentence_text]
                     full_context_string = " ".join(filter(None, context_texts_to_summarize)).strip()
-                    
-                    entities_list = extract_entity(full_context_string) 
-                    output_sentence_data['co_text'] = full_context_string
-                    output_sentence_data['entities'] = entities_list
+                    output_sentence_data['co-text'] = full_context_string
 
                     if full_context_string:
-                        batch_inputs.append({"context_text": full_context_string})
-                        sentences_to_update.append(output_sentence_data)
+                        passive_entries.append(output_sentence_data)
                     else:
                         output_sentence_data['context'] = "NA"
                 processed_file_entries.append(output_sentence_data)
+
+            if passive_entries:
+                analyses = analyze_co_texts([entry['co-text'] for entry in passive_entries], nlp=self.nlp)
+                for output_sentence_data, (entities_list, co_text_features) in zip(passive_entries, analyses):
+                    output_sentence_data['entities'] = entities_list
+                    # parsed here rather than by the verifier, which runs on the LLM thread; not exported
+                    output_sentence_data['_co_text_features'] = co_text_features
+
+                if self.context_mode != "summary":
+                    self._retrieve(processed_file_entries, passive_entries)
+            
+            sentences_dict[filename] = processed_file_entries
+            
+        return sentences_dict
+
+    def _retrieve(self, file_entries: list, passive_entries: list):
+        """
+        Per-document retrieval index: the sentence vectors of the whole file are kept in one matrix, and the
+        cosine similarities of all passive sentences to all sentences are computed with a single matrix product.
+        Each passive sentence gets its top_k most similar earlier sentences outside its co-text window, in document order.
+        """
+        import numpy as np
+
+        texts = [entry['text'] for entry in file_entries]
+        # only the static word vectors are needed, no pipeline component has to run
+        vectors = np.vstack([doc.vector for doc in self.nlp.pipe(texts, disable=self.nlp.pipe_names)]).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+
+        position = {id(entry): i for i, entry in enumerate(file_entries)}
+        query_positions = np.array([position[id(entry)] for entry in passive_entries])
+        similarities = vectors[query_positions] @ vectors.T
+        # only sentences before the window of the passive sentence can be retrieved
+        similarities[np.arange(len(texts))[None, :] >= (query_positions - self.window_size)[:, None]] = -np.inf
+
+        k = min(self.top_k, len(texts))
+        top_positions = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        for row, output_sentence_data in enumerate(passive_entries):
+            retrieved = sorted(i for i in top_positions[row] if np.isfinite(similarities[row, i]))
+            retrieved_text = " ".join(texts[i] for i in retrieved)
+            output_sentence_data['retrieved_context'] = retrieved_text
+            if self.context_mode == "index":
+                output_sentence_data['context'] = retrieved_text if retrieved_text else "NA"
+
+    def summarize(self, sentences_dict: dict) -> dict:
+        """
+        LLM part of the agent: summarize the co-text of every prepared passive sentence that has no context yet
+        (preceded by the retrieved sentences in the 'both' mode). Identical inputs are summarized once.
+        """
+        for filename, list_of_sentence_data_dicts in sentences_dict.items():
+            # batching attempt here
+            batch_inputs = []
+            sentences_to_update = []
+            input_positions = {}
+            for sentence_data in list_of_sentence_data_dicts:
+                if sentence_data.get('voice_type') in ['1', '2'] and sentence_data.get('context') is None:
+                    context_text = " ".join(filter(None, [sentence_data.get('retrieved_context'), sentence_data['co-text']]))
+                    if context_text not in input_positions:
+                        input_positions[context_text] = len(batch_inputs)
+                        batch_inputs.append({"context_text": context_text})
+                        sentences_to_update.append([])
+                    sentences_to_update[input_positions[context_text]].append(sentence_data)
                 
             if batch_inputs:
                 try:
@@ -85,14 +177,13 @@ class ContextRetrieverAgent:
                     print(f"Error during batched context summarization in file '{filename}: {e}")
                     summaries = len(batch_inputs) * [e]
 
-                for sentence_data, summary in zip(sentences_to_update, summaries):
-                    if isinstance(summary, Exception):
-                        display_text = sentence_data.get('text, [No text]')[:50]
-                        print(f"Error during batched context summarization for sentence'{display_text}...': {summary}")
-                        sentence_data['context'] = "NA"
-                    else:
-                        sentence_data['context'] = summary.strip()
-            
-            sentences_dict[filename] = processed_file_entries
+                for sentences_with_input, summary in zip(sentences_to_update, summaries):
+                    for sentence_data in sentences_with_input:
+                        if isinstance(summary, Exception):
+                            display_text = sentence_data.get('text', '[No text]')[:50]
+                            print(f"Error during batched context summarization for sentence'{display_text}...': {summary}")
+                            sentence_data['context'] = "NA"
+                        else:
+                            sentence_data['context'] = summary.strip()
             
         return sentences_dict
\ No newline at end of file
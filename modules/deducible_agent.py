@@ -1,9 +1,10 @@
+from __future__ import annotations
 import json
+from typing import TYPE_CHECKING
 from pprint import pprint
 
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+if TYPE_CHECKING:
+    from langchain_core.language_models.llms import LLM
 
 class DeducibleAgent:
     """
@@ -16,19 +17,25 @@ class DeducibleAgent:
     """
 
     def __init__(self, llm: LLM): 
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
 
-        template = (
+        # The verb list is the same for every request of a run, so it belongs to the fixed (system) prefix
+        system_template = (
             "You are a linguistic expert. Your task is to identify the main action verb "
-            "from a given verb phrase of a sentence and find its match from a provided list of verbs.\n\n"
-            "Sentence: \"{sentence}\"\n"
-            "Verb Phrase: \"{verb_phrase}\"\n\n"
+            "from a given verb phrase of a sentence and find its match from the following list of verbs.\n\n"
             "Verb List:\n---\n{verb_list}\n---\n\n"
             "Based on the verb phrase, which verb from the list is similar?\n"
             "If no verb in the list is a good match, respond with the word 'None'.\n"
-            "RESPOND ONLY WITH THE VERB, DO NOT ADD ADDITIONAL TEXT.\n\n"
-            "\n\nMatching Verb:"
+            "RESPOND ONLY WITH THE VERB, DO NOT ADD ADDITIONAL TEXT."
+        )
+        template = (
+            "Sentence: \"{sentence}\"\n"
+            "Verb Phrase: \"{verb_phrase}\"\n\n"
+            "Matching Verb:"
         )
-        prompt = ChatPromptTemplate.from_template(template)
+        self.template = system_template + template
+        prompt = ChatPromptTemplate.from_messages([("system", system_template), ("human", template)])
         self.chain = prompt | llm | StrOutputParser()
 
     def run(self, sentences_dict: dict, deducible_agent_map: dict) -> dict:
@@ -0,0 +1,171 @@
+import math
+import time
+import random
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+class LLMUsageCounter(BaseCallbackHandler):
+    """
+    Callback handler counting LLM calls, their latency and token usage.
+    Attach it to the language model (callbacks=[counter]); it is thread-safe, so batched calls are counted too.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _token_usage(response)
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            self.calls += 1
+            if started is not None:
+                self.seconds += time.perf_counter() - started
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._started.pop(run_id, None)
+            self.calls += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "seconds": self.seconds,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+def _token_usage(response) -> tuple:
+    """
+    Read (prompt tokens, completion tokens) from an LLMResult. Ollama reports them in the generation info,
+    newer chat models in the message usage metadata, OpenAI in llm_output.
+    """
+    prompt_tokens = 0
+    completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            info = generation.generation_info or {}
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+            elif "eval_count" in info or "prompt_eval_count" in info:
+                prompt_tokens += info.get("prompt_eval_count") or 0
+                completion_tokens += info.get("eval_count") or 0
+    if not (prompt_tokens or completion_tokens):
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+def stratified_sample(sentences_dict: dict, fraction: float = 0.05, sentences_per_file: int = 200, num_strata: int = 4, seed: int = 0) -> dict:
+    """
+    Sample files stratified by length, and a contiguous block of sentences from each sampled file
+    (contiguous so that the co-text windows stay realistic).
+    :param sentences_dict: Dictionary where keys are filenames and values are lists of sentences.
+    :param fraction: Fraction of the files of every stratum to sample (at least one file per stratum).
+    :param sentences_per_file: Maximum number of sentences taken from each sampled file.
+    :param num_strata: Number of length strata (quantiles of the number of sentences per file).
+    :param seed: Random seed.
+    :return: a dictionary with the same layout as sentences_dict.
+    """
+    rng = random.Random(seed)
+    filenames = sorted(sentences_dict, key=lambda name: len(sentences_dict[name]))
+    stratum_size = max(1, math.ceil(len(filenames) / num_strata))
+
+    sample = {}
+    for start in range(0, len(filenames), stratum_size):
+        stratum = filenames[start:start + stratum_size]
+        for filename in rng.sample(stratum, max(1, round(fraction * len(stratum)))):
+            sentences = sentences_dict[filename]
+            offset = rng.randint(0, max(0, len(sentences) - sentences_per_file))
+            sample[filename] = list(sentences[offset:offset + sentences_per_file])
+    return sample
+
+def wilson_interval(successes: int, n: int, z: float = 1.96) -> tuple:
+    """
+    Wilson score interval of a proportion (95% by default).
+    :return: (lower, upper), or (0.0, 1.0) if n is 0.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+def project_run(total_sentences: int, detection: dict, stages: dict, mystification_counts: dict, num_workers: int) -> dict:
+    """
+    Project the cost of a full run from a sample.
+    :param total_sentences: number of sentences in the whole corpus.
+    :param detection: {'sentences', 'full', 'truncated', 'seconds'} of the passive detection on the sample.
+    :param stages: stage name -> {'unit': 'passive' or 'truncated', 'units', 'seconds', 'calls', 'llm_seconds',
+                   'prompt_tokens', 'completion_tokens'} measured on the LLM subset ('llm_seconds' is the summed
+                   latency of the stage's LLM calls, as counted by LLMUsageCounter).
+    :param mystification_counts: mystification_idx -> count over the passive sentences of the LLM subset.
+    :param num_workers: number of pool workers of the projected run.
+    :return: a JSON-serializable dictionary with the projection.
+    """
+    sampled = detection['sentences']
+    passive_rate = (detection['full'] + detection['truncated']) / sampled if sampled else 0.0
+    truncated_rate = detection['truncated'] / sampled if sampled else 0.0
+    projected_units = {
+        'passive': total_sentences * passive_rate,
+        'truncated': total_sentences * truncated_rate,
+    }
+
+    totals = {'calls': 0.0, 'prompt_tokens': 0.0, 'completion_tokens': 0.0}
+    worker_seconds = total_sentences * (detection['seconds'] / sampled if sampled else 0.0)
+    per_stage = {}
+    for stage_name, measured in stages.items():
+        units = measured['units']
+        scale = projected_units[measured['unit']] / units if units else 0.0
+        per_stage[stage_name] = {
+            'calls': measured['calls'] * scale,
+            'seconds': measured['seconds'] * scale,
+            'calls_per_sentence': measured['calls'] / units if units else None,
+            'seconds_per_sentence': measured['seconds'] / units if units else None,
+            'seconds_per_call': measured['llm_seconds'] / measured['calls'] if measured['calls'] else None,
+        }
+        for key in totals:
+            totals[key] += measured[key] * scale
+        worker_seconds += measured['seconds'] * scale
+
+    num_passives = sum(mystification_counts.values())
+    shares = {}
+    for label, count in sorted(mystification_counts.items()):
+        lower, upper = wilson_interval(count, num_passives)
+        shares[label] = {'share': count / num_passives, 'ci95': [lower, upper]}
+
+    return {
+        'total_sentences': total_sentences,
+        'sampled_sentences': sampled,
+        'passive_rate': {'value': passive_rate, 'ci95': list(wilson_interval(detection['full'] + detection['truncated'], sampled))},
+        'truncated_passive_rate': {'value': truncated_rate, 'ci95': list(wilson_interval(detection['truncated'], sampled))},
+        'projected_passives': projected_units['passive'],
+        'projected_truncated_passives': projected_units['truncated'],
+        'projected_llm_calls': totals['calls'],
+        'projected_prompt_tokens': totals['prompt_tokens'],
+        'projected_completion_tokens': totals['completion_tokens'],
+        'projected_worker_seconds': worker_seconds,
+        'num_workers': num_workers,
+        'projected_wall_clock_seconds': worker_seconds / max(1, num_workers),
+        'stages': per_stage,
+        'mystification_idx_shares': shares,
+    }
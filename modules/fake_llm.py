@@ -0,0 +1,66 @@
+import os
+import re
+import time
+import threading
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+_QUOTED_LABEL = re.compile(r"'([^'\s]+)'")
+_ENTITY_LIST = re.compile(r"List of entities in the co-text: \[([^\]]*)\]")
+_QUOTED_ENTITY = re.compile(r"'([^']+)'")
+
+class FakeLabelChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the language model, for repeatable performance runs without an LLM server.
+    Every call sleeps `latency` seconds, then answers with the first quoted label of the system prompt
+    (e.g. 'contextual', '2', 'yes'), or with default_answer if the system prompt has none. Agent-guessing prompts
+    (AgentClassifierAgent) get the first entity of their entity list, or agent_answer if there is none, so that
+    the verifier's pre-check and LLM path run as they would with a real model.
+    With prefill_latency set, it also models the prompt cache of a single-slot llama.cpp server: the part of the
+    prompt shared with the previous call is free, every other character costs prefill_latency seconds.
+    """
+    latency: float = 0.0
+    prefill_latency: float = 0.0
+    default_answer: str = "NA"
+    agent_answer: str = "the authorities"
+    _last_prompt: str = PrivateAttr(default="")
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _prompt_chars: int = PrivateAttr(default=0)
+    _cached_chars: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-label"
+
+    @property
+    def prefix_hit_rate(self) -> float:
+        """
+        Share of the prompt characters served from the cache so far.
+        """
+        return self._cached_chars / self._prompt_chars if self._prompt_chars else 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "".join(f"<|{m.type}|>\n{m.content}\n" for m in messages)
+        with self._lock:
+            cached = len(os.path.commonprefix([prompt, self._last_prompt]))
+            self._last_prompt = prompt
+            self._prompt_chars += len(prompt)
+            self._cached_chars += cached
+        time.sleep(self.latency + self.prefill_latency * (len(prompt) - cached))
+
+        answer = self._answer(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def _answer(self, messages) -> str:
+        last_text = str(messages[-1].content) if messages else ""
+        if last_text.rstrip().endswith("Guessed Agent:"):
+            entity_list = _ENTITY_LIST.search(last_text)
+            entities = _QUOTED_ENTITY.findall(entity_list.group(1)) if entity_list else []
+            return next((entity for entity in entities if entity != "NA"), self.agent_answer)
+
+        system_text = " ".join(str(m.content) for m in messages if isinstance(m, SystemMessage))
+        match = _QUOTED_LABEL.search(system_text)
+        return match.group(1) if match else self.default_answer
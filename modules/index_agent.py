@@ -1,31 +1,40 @@
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 
 class MystificationClassifierAgent:
-    def __init__(self, llm):
+    labels = ['2', '3']
+
+    def __init__(self, llm, constrained: bool = True):
         """
         Initializes the MystificationClassifierAgent.
 
         :param llm: An initialized Langchain LLM instance (e.g., ChatOpenAI for GPT-4o).
+        :param constrained: If True, answers are constrained to (and validated against) the allowed labels.
         """
-        template=(
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        from .label_decoding import LabelChain
+
+        system_template=(
             "Your primary task is to assign a mystification level to a specific TARGET SENTENCE.\n"            
             "Mystification Index Definitions:\n"
             "- '2': Guessable with certainty (Agent is strongly implied by verb, world knowledge, or very strong immediate context).\n"
             "- '3': Mysterious and unknown (Agent is not recoverable from broader context or common knowledge).\n"
+            "OUTPUT ONLY THE MYSTIFICATION NUMBER (2 OR 3) FOR THE TARGET SENTENCE. DO NOT ADD ADDITIONAL REASONING OR TEXT."
+        )
+        template=(
             "Input Information:\n"
             "Target sentence (the sentence you are analyzing): {text}\n"
             "Text Window (this window contains the TARGET SENTENCE you are analyzing): {text_window}\n"
             "Extracted Verb Phrase: {verb_phrase}\n"
             "Summary of Surrounding Context: {context_summary}\n"
             "Guessed Agent of the Verb Phrase: {guessed_agent}\n"
-            "Determined Agent Status for the TARGET SENTENCE (implied, or unknown): {agent_status}\n\n"
-            
-            "OUTPUT ONLY THE MYSTIFICATION NUMBER (2 OR 3)FOR THE TARGET SENTENCE. DO NOT ADD ADDITIONAL REASONING OR TEXT."
+            "Determined Agent Status for the TARGET SENTENCE (implied, or unknown): {agent_status}"
         )
-        prompt = ChatPromptTemplate.from_template(template)
-        self.chain = prompt | llm | StrOutputParser()
+        self.template = system_template + template
+        prompt = ChatPromptTemplate.from_messages([("system", system_template), ("human", template)])
+        if constrained:
+            self.chain = LabelChain(prompt, llm, self.labels)
+        else:
+            self.chain = prompt | llm | StrOutputParser()
 
     def run(self, sentences_dict: dict) -> dict:
         """
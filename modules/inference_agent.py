@@ -1,6 +1,3 @@
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 
 class AgentInferenceAgent:
     """
@@ -9,11 +6,29 @@ class AgentInferenceAgent:
     :param sentences_dict: A dictionary where keys are filenames and values are lists of 'sentences', 'voice_type', 'context' and appended 'agent_status'.
     :return 
     """
-    def __init__(self, llm):
-        
-        template=(
+    labels = ['contextual', 'other', 'unknown']
+
+    def __init__(self, llm, constrained: bool = True):
+        """
+        :param llm: An instance of a language model (LLM) to use for inference.
+        :param constrained: If True, answers are constrained to (and validated against) the allowed labels.
+        """
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        from .label_decoding import LabelChain
+
+        system_template=(
             "You are analyzing a sentence for the presence of an agent (the doer of an action). "
             "Based on the provided information determine if an agent is contextual, other, or unknown.\n"
+            "Guidance:\n"
+            "Your task is to determine whether the guessed agent of the verb phrase is: \n"
+            "- 'contextual' if the guessed agent is in the provided entity list or deduced agent list;\n"
+            "- 'other' if the guessed agent does not appear in the provided lists;\n"
+            "- 'unknown' if the guessed agent is unknown.\n"
+            "Note that the guessed agent can be paraphrased or not exactly match the entity in the list.\n\n"
+            "Answer ONLY with one of: 'contextual', 'other' or 'unknown'."
+        )
+        template=(
             "Input Details:\n"
             "1. Target sentence: {sentence}\n"
             "2. Verb phrase: {verb_phrase}\n"
@@ -22,17 +37,14 @@ class AgentInferenceAgent:
             "5. Entity list: {entities_list}\n"
             "6. Deduced agent list: {deducible_list}\n"
             "7. Guessed agent of the verb phrase: {guessed_agent}\n"
-            "Guidance:\n"
-            "Your task is to determine whether the guessed agent of the verb phrase is: \n"
-            "- 'contextual' if the guessed agent is in the provided entity list or deduced agent list;\n"
-            "- 'other' if the guessed agent does not appear in the provided lists;\n"
-            "- 'unknown' if the guessed agent is unknown.\n"
-            "Note that the guessed agent can be paraphrased or not exactly match the entity in the list.\n\n"
-            "Answer ONLY with one of: 'contextual', 'other' or 'unknown'.\n"
             "Agent Status ('contextual', 'other' or 'unknown'):"
         )
-        prompt = ChatPromptTemplate.from_template(template)
-        self.chain = prompt | llm | StrOutputParser()
+        self.template = system_template + template
+        prompt = ChatPromptTemplate.from_messages([("system", system_template), ("human", template)])
+        if constrained:
+            self.chain = LabelChain(prompt, llm, self.labels)
+        else:
+            self.chain = prompt | llm | StrOutputParser()
 
     def run(self, sentences_dict: dict) -> dict:
         for filename, list_of_sentence_data_dicts in sentences_dict.items():
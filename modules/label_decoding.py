@@ -0,0 +1,114 @@
+from __future__ import annotations
+import re
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+
+_LABEL_PUNCTUATION = "\"'`*.,;:!?()[]{} \n\t"
+
+def normalize_label(output: str, labels: list):
+    """
+    Map a raw model answer onto one of the allowed labels.
+    Handles JSON answers from schema-constrained decoding ('{"label": "yes"}'), quotes, case and trailing
+    punctuation ('Contextual.'), and a label followed by an explanation ('2\n\nReason: ...').
+    :param output: the raw model answer.
+    :param labels: the allowed labels.
+    :return: the matching label, or None if the answer is not one of the labels.
+    """
+    if not isinstance(output, str):
+        return None
+    text = output.strip()
+
+    if text.startswith("{"):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict) and parsed:
+            text = str(parsed.get("label", next(iter(parsed.values()))))
+
+    allowed = {str(label).lower(): label for label in labels}
+    first_line = text.split("\n", 1)[0].strip(_LABEL_PUNCTUATION).lower()
+    if first_line in allowed:
+        return allowed[first_line]
+
+    words = re.findall(r"[\w']+", text.lower())
+    first_word = words[0].strip(_LABEL_PUNCTUATION) if words else ""
+    if first_word in allowed:
+        return allowed[first_word]
+    return None
+
+def _copy_model(llm, **update):
+    # pydantic v2 models use model_copy, v1 models use copy
+    if hasattr(llm, "model_copy"):
+        return llm.model_copy(update=update)
+    return llm.copy(update=update)
+
+class LabelChain:
+    """
+    Chain that answers with exactly one label from a fixed set.
+    Ollama models are constrained with a JSON schema whose only field is an enum of the labels; other models
+    are stopped at the first newline with a small token budget. Answers are normalised with normalize_label,
+    and answers outside the label set are asked again up to max_retries times.
+    :param prompt: the ChatPromptTemplate of the agent.
+    :param llm: An initialized Langchain chat model.
+    :param labels: the allowed labels.
+    :param max_retries: number of times an invalid answer is asked again.
+    :param max_tokens: token budget of one answer.
+    """
+    def __init__(self, prompt: ChatPromptTemplate, llm, labels: list, max_retries: int = 2, max_tokens: int = 16):
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
+        self.labels = list(labels)
+        self.max_retries = max_retries
+
+        constrained_llm = self._constrain(llm, max_tokens)
+        labels_str = ", ".join(f"'{label}'" for label in self.labels)
+        retry_prompt = prompt + ChatPromptTemplate.from_messages([
+            ("ai", "{previous_answer}"),
+            ("human", f"That is not a valid answer. Answer with exactly one of: {labels_str}. Do not add any other text."),
+        ])
+        self.chain = prompt | constrained_llm | StrOutputParser()
+        self.retry_chain = retry_prompt | constrained_llm | StrOutputParser()
+
+    def _constrain(self, llm, max_tokens: int):
+        if hasattr(llm, "format") and hasattr(llm, "num_predict"):  # Ollama
+            schema = {
+                "type": "object",
+                "properties": {"label": {"type": "string", "enum": self.labels}},
+                "required": ["label"],
+            }
+            return _copy_model(llm, format=schema, num_predict=max_tokens)
+        if hasattr(llm, "max_tokens"):
+            llm = _copy_model(llm, max_tokens=max_tokens)
+        return llm.bind(stop=["\n"])
+
+    def batch(self, inputs: list, config: dict = None) -> list:
+        """
+        Same interface as a Langchain chain's batch, but every answer is a valid label.
+        Answers that are still invalid after the retries are returned as ValueError (or raised,
+        if config does not set return_exceptions).
+        """
+        config = config or {}
+        answers = self.chain.batch(inputs, config=config)
+        labels = [a if isinstance(a, Exception) else normalize_label(a, self.labels) for a in answers]
+
+        for _ in range(self.max_retries):
+            pending = [i for i, label in enumerate(labels) if label is None]
+            if not pending:
+                break
+            retry_inputs = [{**inputs[i], "previous_answer": answers[i]} for i in pending]
+            retried = self.retry_chain.batch(retry_inputs, config=config)
+            for i, answer in zip(pending, retried):
+                answers[i] = answer
+                labels[i] = answer if isinstance(answer, Exception) else normalize_label(answer, self.labels)
+
+        for i, label in enumerate(labels):
+            if label is None:
+                labels[i] = ValueError(f"Invalid label {answers[i]!r}, expected one of {self.labels}.")
+                if not config.get("return_exceptions"):
+                    raise labels[i]
+        return labels
@@ -1,3 +1,5 @@
+from .utils import get_agent_from_doc
+
 class PassiveDetectorAgent:
     """
     Agent to detect full and truncated passive sentences in a given set of sentences (input as a dictionary).
@@ -7,9 +9,11 @@ class PassiveDetectorAgent:
                             '0': non-passive sentences
                             '1': full-passive sentences
                             '2': truncated-passive sentences
+                            For full-passive sentences the agent is extracted from the same parse and stored as the fourth index.
     """
-    def __init__(self, passivepy_instance):
+    def __init__(self, passivepy_instance, batch_size: int = 64):
         self.passivepy = passivepy_instance
+        self.batch_size = batch_size
 
     def run(self, sentences_dict):
         for filename, sentences_data in sentences_dict.items():
@@ -21,26 +25,32 @@ class PassiveDetectorAgent:
             elif isinstance(sentences_data, (list, tuple)):
                 sentences_list_to_process = sentences_data
     
-            for sentence_item in sentences_list_to_process:
+            # parse the whole file in batches instead of one sentence at a time, the matchers do not need entities
+            nlp = self.passivepy.nlp
+            docs = nlp.pipe(sentences_list_to_process, batch_size=self.batch_size, disable=[name for name in nlp.pipe_names if name == "ner"])
+            for sentence_item, doc in zip(sentences_list_to_process, docs):
                 sentence_text = ""
                 voice_type = '0' #default is non-passive
                 verb_phrase_str = "NA" #default for non-passive
+                agent_str = "NA" #default for non-passive and truncated-passive
 
                 sentence_text = sentence_item
-                doc = self.passivepy.nlp(sentence_text)
 
-                # check for full passive
+                # check for full passive; the verb phrase is the first matched span, as PassivePy's match_text
+                # would return it, but taken from this parse instead of parsing the sentence again
                 full_match = self.passivepy._find_unique_spans(doc, truncated_passive=False, full_passive=True)
                 if full_match:
                     voice_type = '1'
-                    verb_phrase_str = self.passivepy.match_text(sentence_text, full_passive=True, truncated_passive=False)["full_passive_matches"][0][0]
+                    verb_phrase_str = full_match[0]
+                    agent_str = get_agent_from_doc(doc)
                 else:
                     truncated_match = self.passivepy._find_unique_spans(doc, truncated_passive=True, full_passive=False)
                     if truncated_match:
                        voice_type = '2'
-                       verb_phrase_str = self.passivepy.match_text(sentence_text, full_passive=False, truncated_passive=True)["truncated_passive_matches"][0][0]
+                       # the truncated matcher includes one token after the verb, match_text reports the span of the general matcher
+                       verb_phrase_str = (self.passivepy._find_unique_spans(doc) or truncated_match)[0]
 
-                processed_sentences_for_file.append([sentence_text, voice_type, verb_phrase_str])
+                processed_sentences_for_file.append([sentence_text, voice_type, verb_phrase_str, agent_str])
             
             sentences_dict[filename] = processed_sentences_for_file
 
@@ -0,0 +1,154 @@
+import os
+import io
+import glob
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from collections import defaultdict
+
+class StageProfiler:
+    """
+    Opt-in profiler for the agent stages of a pipeline worker.
+    Each stage is wrapped with cProfile and a pair of tracemalloc snapshots; the results are written
+    to output_dir as one .prof file per worker and stage, plus one allocation report per worker.
+    The wall-clock duration of every stage call is recorded in any case (see pop_timings).
+    :param output_dir: directory for the per-worker reports. If None, profiling is disabled and stage() only times the block.
+    :param top_n: number of allocation sites kept per stage in the worker report.
+    """
+    def __init__(self, output_dir: str = None, top_n: int = 100):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.worker_id = f"worker-{os.getpid()}"
+        self.profiles = {}
+        self.allocations = defaultdict(lambda: defaultdict(lambda: [0, 0]))  # stage -> "file:line" -> [bytes, blocks]
+        self.stage_seconds = defaultdict(list)  # stage -> wall-clock seconds of every call
+
+        if self.enabled:
+            os.makedirs(output_dir, exist_ok=True)
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.output_dir is not None
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profile the enclosed block as stage 'name'. Repeated calls for the same stage accumulate.
+        """
+        started = time.perf_counter()
+        if not self.enabled:
+            try:
+                yield
+            finally:
+                self.stage_seconds[name].append(time.perf_counter() - started)
+            return
+
+        profile = self.profiles.setdefault(name, cProfile.Profile())
+        before = self._snapshot()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            after = self._snapshot()
+            for stat in after.compare_to(before, 'lineno'):
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                site = self.allocations[name][f"{frame.filename}:{frame.lineno}"]
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+            self.stage_seconds[name].append(time.perf_counter() - started)
+
+    def pop_timings(self) -> dict:
+        """
+        Return the stage durations recorded since the last call, and forget them.
+        """
+        timings = dict(self.stage_seconds)
+        self.stage_seconds = defaultdict(list)
+        return timings
+
+    def dump(self):
+        """
+        Write the accumulated profiles of this worker. Called after every task, since pool workers
+        are terminated without running exit handlers.
+        """
+        if not self.enabled:
+            return
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(self.output_dir, f"{self.worker_id}.{name}.prof"))
+
+        report = {}
+        for name, sites in self.allocations.items():
+            top_sites = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[:self.top_n]
+            report[name] = {site: values for site, values in top_sites}
+        with open(os.path.join(self.output_dir, f"{self.worker_id}.alloc.json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+    @staticmethod
+    def _snapshot():
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+def clear_profiles(profile_dir: str):
+    """
+    Remove the worker and corpus reports of an earlier run from profile_dir, so that merge_profiles only
+    merges the workers of the next one. Call it before the workers start.
+    """
+    patterns = ("worker-*.prof", "worker-*.alloc.json", "corpus.*.prof", "profile_report.txt")
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(profile_dir, pattern)):
+            os.remove(path)
+
+def merge_profiles(profile_dir: str, top_n: int = 25) -> str:
+    """
+    Merge the per-worker profiles written by StageProfiler into one corpus-level report (every worker file in
+    profile_dir, see clear_profiles).
+    Writes a combined 'corpus.<stage>.prof' per stage (loadable with pstats or snakeviz) and 'profile_report.txt'
+    with the top functions by cumulative time and the top allocation sites of every stage.
+    :param profile_dir: the directory given to StageProfiler.
+    :param top_n: number of functions and allocation sites listed per stage.
+    :return: path of the text report.
+    """
+    prof_files = defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(profile_dir, "worker-*.prof"))):
+        stage_name = os.path.basename(path).split('.')[1]
+        prof_files[stage_name].append(path)
+
+    allocations = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for path in glob.glob(os.path.join(profile_dir, "worker-*.alloc.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            for stage_name, sites in json.load(f).items():
+                for site, (size, count) in sites.items():
+                    allocations[stage_name][site][0] += size
+                    allocations[stage_name][site][1] += count
+
+    report = io.StringIO()
+    num_workers = len({os.path.basename(p).split('.')[0] for paths in prof_files.values() for p in paths})
+    report.write(f"Profile of {num_workers} worker(s)\n\n")
+    for stage_name, paths in prof_files.items():
+        report.write(f"===== {stage_name} =====\n")
+        stats = pstats.Stats(*paths, stream=report)
+        stats.dump_stats(os.path.join(profile_dir, f"corpus.{stage_name}.prof"))
+        stats.sort_stats('cumulative').print_stats(top_n)
+
+        top_sites = sorted(allocations[stage_name].items(), key=lambda item: item[1][0], reverse=True)[:top_n]
+        if top_sites:
+            report.write("Top allocations (bytes still allocated after the stage, blocks):\n")
+            for site, (size, count) in top_sites:
+                report.write(f"  {size / 1024:12.1f} KiB  {count:8d}  {site}\n")
+        report.write("\n")
+
+    report_path = os.path.join(profile_dir, "profile_report.txt")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(report.getvalue())
+    return report_path
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Metrics compared by compare_run_reports, and whether a higher value is better
+REPORT_METRICS = {
+    'sentences_per_sec': True,
+    'passives_per_sec': True,
+    'llm_calls_per_passive': False,
+    'peak_rss_mb': False,
+}
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of the current process in MiB (None if unknown on this platform).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers (q between 0 and 100).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+def build_run_report(num_files: int, num_sentences: int, num_passives: int, wall_seconds: float,
+                     stage_seconds: dict, workers: dict, config: dict = None) -> dict:
+    """
+    Throughput report of one pipeline run.
+    :param num_files: number of input files.
+    :param num_sentences: number of input sentences.
+    :param num_passives: number of passive sentences found.
+    :param wall_seconds: wall-clock time of the run.
+    :param stage_seconds: stage name -> list of the durations of its calls, over all workers.
+    :param workers: worker id -> {'peak_rss_mb', 'llm_calls'}.
+    :param config: settings of the run (workers, model, ...) stored as-is for reference.
+    :return: a JSON-serializable dictionary.
+    """
+    llm_calls = sum(worker.get('llm_calls') or 0 for worker in workers.values())
+    peak_rss_values = [worker['peak_rss_mb'] for worker in workers.values() if worker.get('peak_rss_mb') is not None]
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': config or {},
+        'files': num_files,
+        'sentences': num_sentences,
+        'passive_sentences': num_passives,
+        'wall_seconds': wall_seconds,
+        'sentences_per_sec': num_sentences / wall_seconds if wall_seconds else None,
+        'passives_per_sec': num_passives / wall_seconds if wall_seconds else None,
+        'llm_calls': llm_calls,
+        'llm_calls_per_passive': llm_calls / num_passives if num_passives else None,
+        'peak_rss_mb': max(peak_rss_values) if peak_rss_values else None,
+        'stages': {
+            stage_name: {
+                'calls': len(durations),
+                'total_seconds': sum(durations),
+                'p50_seconds': percentile(durations, 50),
+                'p95_seconds': percentile(durations, 95),
+            }
+            for stage_name, durations in stage_seconds.items()
+        },
+        'workers': workers,
+    }
+
+def _report_metrics(report: dict) -> dict:
+    metrics = {name: (report.get(name), higher_is_better) for name, higher_is_better in REPORT_METRICS.items()}
+    for stage_name, stage in report.get('stages', {}).items():
+        metrics[f"{stage_name}.p50_seconds"] = (stage.get('p50_seconds'), False)
+        metrics[f"{stage_name}.p95_seconds"] = (stage.get('p95_seconds'), False)
+    return metrics
+
+def compare_run_reports(baseline: dict, current: dict, max_regression: float = 0.10) -> list:
+    """
+    Compare two run reports metric by metric.
+    :param baseline: the stored baseline report.
+    :param current: the report of the run under test.
+    :param max_regression: largest accepted relative change in the worse direction (0.10 = 10%).
+    :return: a list of (metric, baseline value, current value, relative change, regressed) tuples;
+             the relative change is positive when the current run is worse. A metric of the baseline that is
+             missing from the current report (e.g. a stage that no longer ran) is a regression, with
+             current value and change None.
+    """
+    current_metrics = _report_metrics(current)
+    comparison = []
+    for metric, (baseline_value, higher_is_better) in _report_metrics(baseline).items():
+        current_value = current_metrics.get(metric, (None, higher_is_better))[0]
+        if not baseline_value:
+            continue
+        if current_value is None:
+            comparison.append((metric, baseline_value, None, None, True))
+            continue
+        change = (current_value - baseline_value) / baseline_value
+        if higher_is_better:
+            change = -change
+        comparison.append((metric, baseline_value, current_value, change, change > max_regression))
+    return comparison
+
+def load_run_report(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_run_report(report: dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+
+# Stages that can be re-run on stored (passive) sentence records, in pipeline order, with the fields each one reads.
+# 'context_retriever' needs whole documents, non-passive sentences included, so it cannot be re-run from an output.
+STAGE_INPUTS = {
+    'deduce_agent': ['text', 'voice_type', 'verb_phrase'],
+    'agent_inferencer': ['text', 'voice_type', 'verb_phrase', 'co-text', 'context', 'entities', 'deducible_agent'],
+    'mystification_classifier': ['text', 'voice_type', 'verb_phrase', 'co-text', 'context', 'agent_status'],
+    'agent_classifier': ['text', 'voice_type', 'verb_phrase', 'explicit_agent', 'co-text', 'context', 'entities', 'deducible_agent'],
+    'verifier': ['voice_type', 'co-text', 'guessed_agent', 'agent_status'],
+}
+
+# Fields a stage's prompt refers to but that only a later stage sets, so they are always unset when it runs in the
+# pipeline. They are hidden from the stage on a re-run as well, so that it sees the same inputs as in the pipeline.
+LATER_FIELDS = {
+    'agent_inferencer': ['guessed_agent'],
+    'mystification_classifier': ['guessed_agent'],
+}
+
+# Field written by each stage, and the values it holds when the stage failed for a sentence
+STAGE_OUTPUTS = {
+    'deduce_agent': 'deducible_agent',
+    'agent_inferencer': 'agent_status',
+    'mystification_classifier': 'mystification_idx',
+    'agent_classifier': 'guessed_agent',
+    'verifier': 'agent_verification',
+}
+FAILED_OUTPUTS = ("NA", "error_in_processing")
+
+# Output fields of earlier stages that a stage overwrites for some sentences: the verifier sets agent_status to
+# 'unknown' and mystification_idx to '3' when no agent could be guessed. When an earlier stage recomputes one of
+# these fields on a re-run, the overriding stage has to run again for the same sentences.
+STAGE_OVERRIDES = {
+    'verifier': ['agent_status', 'mystification_idx'],
+}
+
+# Short names accepted by --stages
+STAGE_ALIASES = {
+    'deducible': 'deduce_agent',
+    'inference': 'agent_inferencer',
+    'mystification': 'mystification_classifier',
+    'classifier': 'agent_classifier',
+    'verifier': 'verifier',
+}
+
+def parse_stages(stages_str: str) -> list:
+    """
+    Parse a comma separated list of stage names or aliases (e.g. 'verifier,mystification').
+    :return: the stage names in pipeline order.
+    :raise ValueError: for unknown or non re-runnable stages.
+    """
+    selected = set()
+    for name in filter(None, (part.strip() for part in stages_str.split(','))):
+        stage_name = STAGE_ALIASES.get(name, name)
+        if stage_name not in STAGE_INPUTS:
+            valid = ", ".join(dict.fromkeys(list(STAGE_ALIASES) + list(STAGE_INPUTS)))
+            raise ValueError(f"Stage '{name}' cannot be re-run. Choose from: {valid}.")
+        selected.add(stage_name)
+    return [stage_name for stage_name in STAGE_INPUTS if stage_name in selected]
+
+def with_overriding_stages(stage_names: list) -> list:
+    """
+    Add the stages that overwrite an output field of one of stage_names (see STAGE_OVERRIDES).
+    :return: the stage names in pipeline order.
+    """
+    selected = set(stage_names)
+    for stage_name in stage_names:
+        selected.update(overriding_stages(stage_name))
+    return [stage_name for stage_name in STAGE_INPUTS if stage_name in selected]
+
+def overriding_stages(stage_name: str) -> list:
+    """
+    The later stages that overwrite the output field of stage_name for some sentences.
+    """
+    order = list(STAGE_INPUTS)
+    output_field = STAGE_OUTPUTS[stage_name]
+    return [other for other, fields in STAGE_OVERRIDES.items()
+            if output_field in fields and order.index(other) > order.index(stage_name)]
+
+def invalidate_overrides(stage_name: str, list_of_sentence_data_dicts: list):
+    """
+    Drop the fingerprints of the stages overriding the output of stage_name on the given (recomputed) sentences,
+    so that they run again on them instead of leaving a value the full pipeline would have overwritten.
+    """
+    for other in overriding_stages(stage_name):
+        for sentence_data in list_of_sentence_data_dicts:
+            (sentence_data.get('stage_fingerprints') or {}).pop(other, None)
+
+def stage_fingerprint(stage_name: str, sentence_data: dict, prompt_key: str = "") -> str:
+    """
+    Hash of everything a stage reads for one sentence: its input fields and the prompt (plus any
+    other configuration passed as prompt_key). A changed fingerprint means the stage must run again.
+    """
+    inputs = {field: sentence_data.get(field) for field in STAGE_INPUTS[stage_name]}
+    payload = json.dumps([stage_name, prompt_key, inputs], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def input_fingerprints(stage_name: str, sentences_dict: dict, prompt_key: str = "") -> list:
+    """
+    Fingerprint the inputs of stage_name for every passive sentence of sentences_dict.
+    Must be called before the stage runs, since some stages overwrite fields they read.
+    :return: a list of (sentence dictionary, fingerprint) pairs, to be passed to store_fingerprints once the stage ran.
+    """
+    pending = []
+    for list_of_sentence_data_dicts in sentences_dict.values():
+        for sentence_data in list_of_sentence_data_dicts:
+            if isinstance(sentence_data, dict) and sentence_data.get('voice_type') in ['1', '2']:
+                pending.append((sentence_data, stage_fingerprint(stage_name, sentence_data, prompt_key)))
+    return pending
+
+def store_fingerprints(stage_name: str, pending: list):
+    """
+    Store the fingerprints of input_fingerprints under 'stage_fingerprints' for the sentences the stage answered.
+    Sentences where it failed (see FAILED_OUTPUTS) lose their fingerprint, so that a re-run retries them.
+    """
+    output_field = STAGE_OUTPUTS[stage_name]
+    for sentence_data, fingerprint in pending:
+        fingerprints = sentence_data.setdefault('stage_fingerprints', {})
+        if sentence_data.get(output_field) in FAILED_OUTPUTS:
+            fingerprints.pop(stage_name, None)
+        else:
+            fingerprints[stage_name] = fingerprint
+
+@contextmanager
+def pipeline_view(stage_name: str, list_of_sentence_data_dicts: list):
+    """
+    Hide the LATER_FIELDS of stage_name from the given sentences while the block runs, then restore them.
+    """
+    hidden = []
+    for sentence_data in list_of_sentence_data_dicts:
+        fields = {field: sentence_data.pop(field) for field in LATER_FIELDS.get(stage_name, []) if field in sentence_data}
+        hidden.append((sentence_data, fields))
+    try:
+        yield
+    finally:
+        for sentence_data, fields in hidden:
+            sentence_data.update(fields)
+
+def changed_sentences(stage_name: str, list_of_sentence_data_dicts: list, prompt_key: str = "") -> list:
+    """
+    The sentences whose inputs to stage_name differ from the ones recorded when the stage last ran.
+    """
+    changed = []
+    for sentence_data in list_of_sentence_data_dicts:
+        stored = (sentence_data.get('stage_fingerprints') or {}).get(stage_name)
+        if stored != stage_fingerprint(stage_name, sentence_data, prompt_key):
+            changed.append(sentence_data)
+    return changed
+
+def load_sentence_records(path: str) -> dict:
+    """
+    Rehydrate the sentence records of a previous run from output.json or a Parquet dataset directory.
+    :return: Dictionary where keys are filenames and values are lists of sentence dictionaries.
+    """
+    if os.path.isdir(path):
+        from .annotator_agent import read_passive_records
+        return read_passive_records(path)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        sentences_dict = json.load(f)
+    if not isinstance(sentences_dict, dict) or {"error", "type"} <= set(sentences_dict):
+        raise ValueError(f"'{path}' is not an output of the pipeline.")
+    return sentences_dict
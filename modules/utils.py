@@ -1,37 +1,222 @@
 import os
 import re
 import sys
-import spacy
-import pyinflect
+
+# Candidate sentence ends: terminal punctuation, optionally followed by closing quotes or brackets, then whitespace
+_SENTENCE_END = re.compile(r'[.!?]+["\'\u201d\u2019)\]]*(?=\s)')
+_LAST_WORD = re.compile(r'(\S+)$')
+_NEXT_CHAR = re.compile(r'\s*(\S)')
+_NEXT_WORD = re.compile(r'\s*[("\'\u201c\u2018\[]*(\S+)')
+_DOTTED_ABBREVIATION = re.compile(r'^(?:[A-Za-z]\.)+[A-Za-z]$')  # e.g, i.e, U.S
+_ABBREVIATIONS = frozenset([
+    "mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "mt.", "gen.", "col.", "lt.", "sgt.", "capt.", "gov.",
+    "sen.", "rep.", "rev.", "hon.", "vs.", "etc.", "al.", "approx.", "ca.", "cf.", "vol.", "fig.",
+    "figs.", "eq.", "ch.", "sec.", "eds.", "inc.", "ltd.", "corp.", "dept.", "univ.",
+    "jan.", "feb.", "mar.", "apr.", "jun.", "jul.", "aug.", "sep.", "sept.", "oct.", "nov.", "dec.",
+])
+# Also common sentence-final words: abbreviations only before a number ("no. 5", "pp. 12-14") ...
+_NUMBER_ABBREVIATIONS = frozenset(["no.", "nos.", "p.", "pp."])
+# ... or before a word that does not start a new sentence ("ed. by", "Smith & Co., London")
+_LOWERCASE_ABBREVIATIONS = frozenset(["co.", "ed."])
+# Capitalised words that usually start a sentence, so a single letter before them is not an initial ("Vitamin C. It ...")
+_SENTENCE_STARTERS = frozenset([
+    "a", "an", "the", "this", "that", "these", "those", "it", "its", "he", "she", "they", "we", "i", "you", "his", "her",
+    "their", "our", "my", "there", "here", "in", "on", "at", "by", "for", "from", "with", "as", "if", "when", "while",
+    "after", "before", "but", "and", "or", "so", "then", "however", "also", "some", "many", "all", "no", "not", "one",
+])
+_HEADING_MAX_WORDS = 8
+# Words a title does not end with; a short line ending with one of them is prose wrapped mid-phrase ("...signed by")
+_CONTINUATION_WORDS = frozenset([
+    "a", "an", "the", "this", "that", "these", "those", "its", "their", "his", "her", "our", "my", "your",
+    "of", "by", "to", "in", "on", "at", "for", "from", "with", "into", "onto", "upon", "over", "under", "about",
+    "between", "through", "and", "or", "but", "nor", "as", "than",
+])
+
+def _strip_span(text: str, start: int, end: int) -> tuple:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def _is_heading(line: str, next_line: str) -> bool:
+    # short, no final punctuation and no sentence end inside, and standing alone: followed by a blank line or the
+    # end of the text, or title-shaped (ending with a capitalised word or a number that is not a function word)
+    # and followed by a capitalised line. Otherwise it is a hard-wrapped line ("The treaty was signed by\nPresident ...")
+    if (
+        line[-1] in '.!?,;:-"\'\u201d\u2019)]'
+        or len(line.split()) > _HEADING_MAX_WORDS
+        or _SENTENCE_END.search(line)
+    ):
+        return False
+    if not next_line:
+        return True
+    last_word = line.split()[-1]
+    title_shaped = (last_word[0].isupper() or last_word[0].isdigit()) and last_word.lower() not in _CONTINUATION_WORDS
+    return title_shaped and next_line[0].isupper()
+
+def _block_spans(text: str) -> list:
+    """
+    Split a text into blocks that a sentence can never cross: paragraphs (separated by blank lines) and
+    heading-like lines (short lines without final punctuation that stand alone, see _is_heading). Other line
+    breaks are hard wraps and are treated as spaces.
+    :return: a list of (start, end) character offsets.
+    """
+    blocks = []
+    block_start = None
+    previous_line = ""
+    line_start = 0
+    length = len(text)
+    while line_start <= length:
+        line_end = text.find('\n', line_start)
+        if line_end == -1:
+            line_end = length
+        line = text[line_start:line_end].strip()
+
+        if not line:
+            if block_start is not None:
+                blocks.append((block_start, line_start))
+                block_start = None
+        else:
+            if block_start is None:
+                block_start = line_start
+            next_line_end = text.find('\n', line_end + 1)
+            next_line = text[line_end + 1:next_line_end if next_line_end != -1 else length].strip()
+            # a line continuing an unfinished sentence of the line above is never a heading
+            starts_sentence = block_start == line_start or previous_line[-1] in '.!?"\'\u201d\u2019)]'
+            if starts_sentence and _is_heading(line, next_line):
+                blocks.append((block_start, line_end))
+                block_start = None
+        previous_line = line
+        line_start = line_end + 1
+
+    if block_start is not None:
+        blocks.append((block_start, length))
+    return blocks
+
+def _is_abbreviation(text: str, sentence_start: int, end_match) -> bool:
+    if not end_match.group().startswith('.') or end_match.group().startswith('..'):
+        return False
+    word_match = _LAST_WORD.search(text, max(sentence_start, end_match.start() - 20), end_match.start())
+    if not word_match:
+        return False
+    word = word_match.group(1).lstrip('("\'\u201c\u2018[')
+    abbreviation = word.lower() + '.'
+    if abbreviation in _ABBREVIATIONS or _DOTTED_ABBREVIATION.match(word):
+        return True
+
+    next_word_match = _NEXT_WORD.match(text, end_match.end())
+    next_word = next_word_match.group(1) if next_word_match else ""
+    if abbreviation in _NUMBER_ABBREVIATIONS:
+        return next_word[:1].isdigit()
+    if abbreviation in _LOWERCASE_ABBREVIATIONS:
+        return bool(next_word) and not next_word[0].isupper()
+    if len(word) == 1 and word.isupper():
+        # initials, e.g. "J. K. Rowling": followed by another initial or a capitalised name
+        name = next_word.rstrip('.,;:!?"\'\u201d\u2019)]')
+        return (
+            len(name) == 1 and next_word.startswith(name + '.') and name.isupper()
+            or name[:1].isupper() and name.lower() not in _SENTENCE_STARTERS
+        )
+    return False
+
+def _continues_after_quote(text: str, end_match) -> bool:
+    # '"Yes!" he said.' is one sentence: quoted speech followed by a lowercase word
+    if end_match.group()[-1] not in '"\'\u201d\u2019':
+        return False
+    next_char = _NEXT_CHAR.match(text, end_match.end())
+    return bool(next_char) and next_char.group(1).islower()
+
+def segment_text(text: str) -> list:
+    """
+    Find the sentences of a text as character offsets, without copying them.
+    Uses precompiled patterns, skips common abbreviations and initials, and never joins text across
+    paragraphs or headings (see _block_spans).
+    :param text: the input text.
+    :return: a list of (start, end) offsets, text[start:end] being a sentence.
+    """
+    spans = []
+    for block_start, block_end in _block_spans(text):
+        sentence_start = block_start
+        for end_match in _SENTENCE_END.finditer(text, block_start, block_end):
+            if _is_abbreviation(text, sentence_start, end_match) or _continues_after_quote(text, end_match):
+                continue
+            spans.append(_strip_span(text, sentence_start, end_match.end()))
+            sentence_start = end_match.end()
+        spans.append(_strip_span(text, sentence_start, block_end))
+    return [(start, end) for start, end in spans if start < end]
+
+def segment_texts(texts: list, nlp=None, batch_size: int = 32) -> list:
+    """
+    Sentence offsets of many texts.
+    :param texts: the input texts.
+    :param nlp: optional spaCy pipeline with a 'senter' or 'parser' component (see load_senter). If given, its
+                sentence boundaries are used, in batch mode and within each paragraph; otherwise segment_text.
+    :param batch_size: number of paragraphs per spaCy batch.
+    :return: one list of (start, end) offsets per text.
+    """
+    if nlp is None:
+        return [segment_text(text) for text in texts]
+
+    owners = []
+    block_texts = []
+    for text_index, text in enumerate(texts):
+        for block_start, block_end in _block_spans(text):
+            owners.append((text_index, block_start))
+            block_texts.append(text[block_start:block_end])
+
+    offsets = [[] for _ in texts]
+    for (text_index, block_start), doc in zip(owners, nlp.pipe(block_texts, batch_size=batch_size)):
+        for sent in doc.sents:
+            start, end = _strip_span(texts[text_index], block_start + sent.start_char, block_start + sent.end_char)
+            if start < end:
+                offsets[text_index].append((start, end))
+    return offsets
+
+def load_senter(model: str = "en_core_web_lg"):
+    """
+    Load a spaCy pipeline with only the statistical sentence segmenter enabled, for segment_texts.
+    """
+    import spacy
+    return spacy.load(model, enable=["senter"])
 
 def split_text_into_sentences(text: str) -> list[str]:
     """
-    Splits a given text into sentences using regex.
+    Splits a given text into sentences (see segment_text).
     :param text: the input text to be split into sentences.
     :return: a list of sentences, where each sentence is a string.
     """
-    sentence_endings = re.compile(r'(?<=[.!?])\s+')
-    sentences = sentence_endings.split(text.strip())
-    return [s.strip() for s in sentences if s.strip()]
+    return [text[start:end].replace('\n', ' ') for start, end in segment_text(text)]
 
-def read_txt_files_to_sentences_dict(folder_path: str) -> dict:
+def read_txt_files_to_segments(folder_path: str, nlp=None) -> dict:
+    """
+    Reads all .txt files in a given folder and finds their sentences as character offsets.
+    :param folder_path: Path to the folder containing .txt files (presumable corpora).
+    :param nlp: optional spaCy sentence segmenter (see segment_texts).
+    :return: a dictionary where the keys are filenames (without extension) and the values are (text, offsets) tuples.
+    """
+    keys = []
+    texts = []
+    for filename in os.listdir(folder_path):
+        if filename.endswith('.txt'):
+            file_path = os.path.join(folder_path, filename)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+            # Use filename without extension as key, or keep full filename as key
+            keys.append(os.path.splitext(filename)[0])
+    return {key: (text, offsets) for key, text, offsets in zip(keys, texts, segment_texts(texts, nlp=nlp))}
+
+def read_txt_files_to_sentences_dict(folder_path: str, nlp=None) -> dict:
     """
     Reads all .txt files in a given folder and splits their content into sentences.
     :param folder_path: Path to the folder containing .txt files (presumable corpora). 
+    :param nlp: optional spaCy sentence segmenter (see segment_texts); the regex segmenter is used if None.
     :return sentences_dict: a dictionary where the keys values are filenames and the values are the lists of sentences
                             in the corresponding files.
     """
     sentences_dict = {}
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-                text = text.replace('\n', '. ')
-                sentences = split_text_into_sentences(text)
-                # Use filename without extension as key, or keep full filename as key
-                key = os.path.splitext(filename)[0]
-                sentences_dict[key] = sentences
+    for key, (text, offsets) in read_txt_files_to_segments(folder_path, nlp=nlp).items():
+        sentences_dict[key] = [text[start:end].replace('\n', ' ') for start, end in offsets]
     return sentences_dict
 
 def get_passive_subject(sentence: str) -> str:
@@ -40,6 +225,7 @@ def get_passive_subject(sentence: str) -> str:
     :param sentence: a sentence in which the subject is in passive voice.
     :return: the subject of the passive sentence, or an empty string if not found.
     """
+    import spacy
     nlp = spacy.load("en_core_web_lg")
     doc = nlp(sentence)
 
@@ -55,6 +241,8 @@ def convert_passive_verb_to_active(passive_phrase: str) -> str:
     :param passive_phrase: The string containing the passive verb phrase.
     :return: The converted active verb phrase as a string.
     """
+    import spacy
+    import pyinflect  # registers the Token._.inflect extension
     nlp = spacy.load("en_core_web_lg")
     doc = nlp(passive_phrase)
 
@@ -93,14 +281,61 @@ def convert_passive_verb_to_active(passive_phrase: str) -> str:
         
     return verb_lemma
 
-def extract_entity(text: str) -> list:
-    nlp = spacy.load("en_core_web_lg")
-    doc = nlp(text)
+def extract_entity(text: str, nlp=None) -> list:
+    return extract_entities([text], nlp=nlp)[0]
+
+def extract_entities(texts: list, nlp=None, batch_size: int = 64) -> list:
+    """
+    Extract the PERSON, ORG, GPE and NORP entities of many texts with one batched nlp.pipe call.
+    :param texts: the texts (e.g. co-text windows of the passive sentences of a file).
+    :param nlp: a loaded spaCy pipeline; en_core_web_lg is loaded if None.
+    :param batch_size: number of texts per spaCy batch.
+    :return: one list of entities per text, ["NA"] if a text has none.
+    """
+    if nlp is None:
+        import spacy
+        nlp = spacy.load("en_core_web_lg")
+    if "ner" not in nlp.pipe_names:
+        raise ValueError(f"The spaCy pipeline has no active 'ner' component (pipes: {nlp.pipe_names}), enable it to extract entities.")
+    # only the NER (and the tok2vec it may listen to) is needed
+    disabled = [name for name in nlp.pipe_names if name not in ("tok2vec", "ner")]
+
+    entities_per_text = []
+    for doc in nlp.pipe(texts, batch_size=batch_size, disable=disabled):
+        entities = list(set([ent.text for ent in doc.ents if ent.label_ in ['PERSON', 'ORG', 'GPE', 'NORP']]))
+        entities_per_text.append(entities if entities else ["NA"])
+    return entities_per_text
+
+def analyze_co_texts(texts: list, nlp, batch_size: int = 64) -> list:
+    """
+    Parse the co-texts of a file with one batched nlp.pipe call, for the entity lists of the context retriever
+    and for the verifier pre-check, which compares guessed agents with the same co-texts later on.
+    :param texts: the co-text windows of the passive sentences of a file.
+    :param nlp: a loaded spaCy pipeline with word vectors, a parser and an active 'ner' component.
+    :param batch_size: number of texts per spaCy batch.
+    :return: one (entities, features) pair per text. The entities are as in extract_entities; the features are
+             {'words': set of the lowercased words and lemmas, 'candidates': float32 matrix of the unit-length
+             vectors of the noun chunks and entities, one row per span}.
+    """
+    import numpy as np
 
-    entities = list(set([ent.text for ent in doc.ents if ent.label_ in ['PERSON', 'ORG', 'GPE', 'NORP']]))
-    return entities if entities else ["NA"]
+    if "ner" not in nlp.pipe_names:
+        raise ValueError(f"The spaCy pipeline has no active 'ner' component (pipes: {nlp.pipe_names}), enable it to extract entities.")
+
+    results = []
+    for doc in nlp.pipe(texts, batch_size=batch_size):
+        entities = list(set([ent.text for ent in doc.ents if ent.label_ in ['PERSON', 'ORG', 'GPE', 'NORP']]))
+        spans = [span for span in list(doc.noun_chunks) + list(doc.ents) if span.has_vector]
+        candidates = np.zeros((len(spans), nlp.vocab.vectors_length), dtype=np.float32)
+        for row, span in enumerate(spans):
+            candidates[row] = span.vector
+        candidates /= np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-8)
+        words = {token.lower_ for token in doc} | {token.lemma_.lower() for token in doc}
+        results.append((entities if entities else ["NA"], {'words': words, 'candidates': candidates}))
+    return results
 
 def get_agent_full_passive(text: str) -> str:
+    import spacy
     nlp = spacy.load("en_core_web_lg")
     doc = nlp(text)
     parts = text.rsplit(' by ', 1)
@@ -116,4 +351,26 @@ def get_agent_full_passive(text: str) -> str:
         else:
             # If spaCy finds no noun chunks, fall back to simple cleaning.
             cleaned_agent = re.sub(r'[.,?!;]+$', '', agent_phrase.strip())
-            return cleaned_agent
\ No newline at end of file
+            return cleaned_agent
+
+def get_agent_from_doc(doc) -> str:
+    """
+    Extract the agent of a full passive sentence from an already parsed spaCy Doc.
+    Follows the 'agent' dependency arc (the "by" token) to its 'pobj' and returns the noun chunk
+    headed by that object, so no further parsing is needed.
+    :param doc: the spaCy Doc of the full passive sentence (as produced during passive detection).
+    :return: the agent phrase, or "NA" if the parse has no agent arc.
+    """
+    for token in doc:
+        if token.dep_ != 'agent':
+            continue
+        for child in token.children:
+            if child.dep_ != 'pobj':
+                continue
+            for chunk in doc.noun_chunks:
+                if chunk.root == child:
+                    return chunk.text.strip()
+            # no noun chunk headed by the object, keep its left modifiers and the object itself
+            return doc[child.left_edge.i:child.i + 1].text.strip()
+
+    return "NA"
@@ -1,33 +1,68 @@
 import os
+import re
 import sys
+import random
 
-from langchain_core.language_models.llms import LLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+_DETERMINERS = {"the", "a", "an", "this", "that", "these", "those", "its", "their", "his", "her", "our", "my", "your"}
+_NON_WORD = re.compile(r"[^\w\s]")
+_CO_TEXT_FEATURES = '_co_text_features'
+
+def _normalize(text: str) -> str:
+    """
+    Lowercase a phrase, drop punctuation and determiners so that 'The Town's historian.' matches 'town s historian'.
+    """
+    words = _NON_WORD.sub(" ", text.lower()).split()
+    return " ".join(w for w in words if w not in _DETERMINERS)
 
 class VerifierAgent:
     """
     An agent to verify whether or not the guessed agent of a passive sentence 
     is explicitly present or clearly co-referenced in the surrounding co-text.
     """
-    def __init__(self, llm):
+    labels = ['yes', 'no']
+
+    def __init__(self, llm, nlp=None, similarity_thresholds: tuple = (0.35, 0.85), audit_rate: float = 0.1, seed: int = 0,
+                 constrained: bool = True):
         """
         :param llm: An instance of a language model (e.g. ChatOpenAI for GPT-4o, Ollama, etc.).
-        :param co_text_window_size: The number of sentences before and after the target sentence
-                                    to consider as the 'co_text'. Defaults to 5.
+        :param nlp: A spaCy pipeline with word vectors (e.g. en_core_web_lg) used for the pre-check, normally the one
+                    of the context retriever. The co-texts are parsed by ContextRetrieverAgent.prepare; the verifier only
+                    reads the vector table for the guessed agents, so the pipeline may be busy on another thread.
+                    Co-texts without prepared features (re-runs from a stored output) are parsed here with nlp.
+                    If None, every candidate is sent to the LLM.
+        :param similarity_thresholds: (lower, upper) cosine similarity thresholds. A guessed agent whose best match
+                                      among the co-text noun chunks and entities is >= upper is verified as 'yes',
+                                      below lower as 'no'; anything in between is left to the LLM.
+        :param audit_rate: Fraction of pre-checked sentences that are also sent to the LLM to measure agreement.
+        :param seed: Seed for choosing the audited sentences.
+        :param constrained: If True, answers are constrained to (and validated against) the allowed labels.
         """
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        from .label_decoding import LabelChain
 
+        self.nlp = nlp
+        self.lower_threshold, self.upper_threshold = similarity_thresholds
+        self.audit_rate = audit_rate
+        self._rng = random.Random(seed)
+
+        system_template=(
+            "You are a verification expert. Your task is to carefully read the text and determine if the given subject phrase can be infered (or appear) within it.\n"
+            "ANSWER ONLY with 'yes' or 'no'."
+        )
         template=(
-            "You are a verification expert. Your task is to carefully read the text and determine if the given subject phrase can be infered (or appear) within it.\n\n"
             "--- Input Data ---\n"
             "Text:\n"
             "\"\"\"\n{co_text}\n\"\"\"\n\n"
             "--- Your Task ---\n"
-            "Does '{guessed_agent}' get stated or appear (might be inferred from) in the Text?\n"
-            "ANSWER ONLY with 'yes' or 'no'."
+            "Does '{guessed_agent}' get stated or appear (might be inferred from) in the Text?"
         )
-        prompt = ChatPromptTemplate.from_template(template)
-        self.chain = prompt | llm | StrOutputParser()
+        self.template = system_template + template
+        prompt = ChatPromptTemplate.from_messages([("system", system_template), ("human", template)])
+        if constrained:
+            self.chain = LabelChain(prompt, llm, self.labels)
+        else:
+            self.chain = prompt | llm | StrOutputParser()
 
     def run(self, sentences_dict: dict) -> dict:
         """
@@ -43,6 +78,7 @@ class VerifierAgent:
             # batching attempt
             batch_inputs = []
             sentences_to_update = []
+            batch_features = []
             for _, sentence_data in enumerate(list_of_sentence_data_dicts):
                 if not isinstance(sentence_data, dict):
                     print(f"Warning: Expected a dictionary for sentence data in {filename}. Skipping.")
@@ -50,6 +86,10 @@ class VerifierAgent:
                 
                 # Verification is only applicable for passive sentences that have a guessed agent.
                 voice_type = sentence_data.get('voice_type')
+                # A re-run decides the sentence again, drop what the previous run left
+                for field in ('agent_verification', 'verification_precheck', 'verification_source'):
+                    sentence_data.pop(field, None)
+                co_text_features = sentence_data.pop(_CO_TEXT_FEATURES, None)
                 
                 # Check if this sentence is a candidate for verification
                 if voice_type == '1': # Full Passive
@@ -69,8 +109,12 @@ class VerifierAgent:
                     }
                     batch_inputs.append(llm_inputs)
                     sentences_to_update.append(sentence_data)
+                    batch_features.append(co_text_features)
                 elif 'agent_verification' not in sentence_data:
                     sentence_data['agent_verification'] = "NA"
+            if batch_inputs and self.nlp is not None:
+                batch_inputs, sentences_to_update = self._apply_precheck(batch_inputs, sentences_to_update, batch_features)
+
             if batch_inputs:
                 try:
                     verifications = self.chain.batch(
@@ -87,8 +131,132 @@ class VerifierAgent:
                         # Handle a failure for this specific sentence
                         display_text = sentence_data.get('text', '[No text]')[:70]
                         print(f"Error during batched verification for sentence '{display_text}...': {verification}")
-                        sentence_data['agent_verification'] = "NA"
+                        if sentence_data.get('verification_source') != "precheck":
+                            # an audited sentence keeps its pre-check answer, only the agreement sample loses it
+                            sentence_data['agent_verification'] = "NA"
                     else:
                         # Handle a successful result
                         sentence_data['agent_verification'] = verification.strip().lower()
-        return sentences_dict
\ No newline at end of file
+                        sentence_data['verification_source'] = "llm"
+        return sentences_dict
+
+    def _apply_precheck(self, batch_inputs: list, sentences_to_update: list, batch_features: list) -> tuple:
+        """
+        Decide the clear-cut candidates of a file without the LLM.
+        :return: the LLM inputs and sentence dictionaries that still need the LLM (ambiguous or audited).
+        """
+        prechecks = self._precheck(batch_inputs, batch_features)
+
+        remaining_inputs = []
+        remaining_sentences = []
+        for llm_inputs, sentence_data, precheck in zip(batch_inputs, sentences_to_update, prechecks):
+            if precheck is not None:
+                sentence_data['verification_precheck'] = precheck
+                sentence_data['agent_verification'] = precheck
+                sentence_data['verification_source'] = "precheck"
+                if self._rng.random() >= self.audit_rate:
+                    continue
+            remaining_inputs.append(llm_inputs)
+            remaining_sentences.append(sentence_data)
+        return remaining_inputs, remaining_sentences
+
+    def _precheck(self, batch_inputs: list, batch_features: list) -> list:
+        """
+        Cheap verification of the guessed agents of one file:
+        1. normalised string match of the guessed agent in the co-text,
+        2. word match (all content words of the guessed agent occur in the co-text, as words or lemmas),
+        3. cosine similarity between the guessed agent vector and the vectors of the co-text noun chunks
+           and entities, computed for the whole file at once.
+        :param batch_inputs: list of {'co_text', 'guessed_agent'} dictionaries.
+        :param batch_features: the co-text features of analyze_co_texts for each input, or None if not prepared.
+        :return: a list with 'yes', 'no' or None (ambiguous) for each input.
+        """
+        import numpy as np
+        from .utils import analyze_co_texts
+
+        decisions = [None] * len(batch_inputs)
+        agents = [str(item.get('guessed_agent') or "") for item in batch_inputs]
+        co_texts = [str(item.get('co_text') or "") for item in batch_inputs]
+
+        for i, (agent, co_text) in enumerate(zip(agents, co_texts)):
+            normalized_agent = _normalize(agent)
+            if normalized_agent and f" {normalized_agent} " in f" {_normalize(co_text)} ":
+                decisions[i] = "yes"
+
+        pending = [i for i, decision in enumerate(decisions) if decision is None and co_texts[i]]
+        if not pending:
+            return decisions
+
+        features = {i: batch_features[i] for i in pending}
+        unprepared = [i for i in pending if features[i] is None]
+        if unprepared:
+            analyses = analyze_co_texts([co_texts[i] for i in unprepared], nlp=self.nlp)
+            features.update((i, co_text_features) for i, (_, co_text_features) in zip(unprepared, analyses))
+
+        stop_words = self.nlp.Defaults.stop_words
+        agent_matrix = np.zeros((len(pending), self.nlp.vocab.vectors_length), dtype=np.float32)
+        candidate_matrices = []
+        owners = []
+        for row, i in enumerate(pending):
+            content_words = {w for w in _normalize(agents[i]).split() if len(w) > 1 and w not in stop_words}
+            if content_words and content_words <= features[i]['words']:
+                decisions[i] = "yes"
+                continue
+            agent_vector = self._phrase_vector(agents[i])
+            if agent_vector is None or not len(features[i]['candidates']):
+                continue
+            agent_matrix[row] = agent_vector
+            candidate_matrices.append(features[i]['candidates'])
+            owners.extend([row] * len(features[i]['candidates']))
+
+        # best similarity per guessed agent, -1 when there is nothing to compare with
+        best = np.full(len(pending), -1.0, dtype=np.float32)
+        if candidate_matrices:
+            candidates = np.vstack(candidate_matrices)
+            owners = np.asarray(owners)
+            agent_matrix /= np.maximum(np.linalg.norm(agent_matrix, axis=1, keepdims=True), 1e-8)
+            similarities = np.einsum('ij,ij->i', candidates, agent_matrix[owners])
+            np.maximum.at(best, owners, similarities)
+
+        for row, i in enumerate(pending):
+            if decisions[i] is not None or best[row] < -0.5:
+                continue
+            if best[row] >= self.upper_threshold:
+                decisions[i] = "yes"
+            elif best[row] < self.lower_threshold:
+                decisions[i] = "no"
+        return decisions
+
+    def _phrase_vector(self, phrase: str):
+        """
+        Average word vector of a short phrase, looked up in the vector table without running the pipeline
+        (exact case first, then lowercase). None if no word of the phrase has a vector.
+        """
+        vectors = self.nlp.vocab.vectors
+        rows = []
+        for word in _NON_WORD.sub(" ", phrase).split():
+            for form in (word, word.lower()):
+                row = vectors.find(key=self.nlp.vocab.strings[form])
+                if row >= 0:
+                    rows.append(row)
+                    break
+        return vectors.data[rows].mean(axis=0) if rows else None
+
+    @staticmethod
+    def agreement_rate(sentences_dict: dict) -> tuple:
+        """
+        Agreement between the pre-check and the LLM on the audited sentences.
+        :param sentences_dict: the processed dictionary (filenames to lists of sentence dictionaries).
+        :return: (number of audited sentences, agreement rate or None if nothing was audited).
+        """
+        audited = 0
+        agreed = 0
+        for list_of_sentence_data_dicts in sentences_dict.values():
+            for sentence_data in list_of_sentence_data_dicts:
+                if not isinstance(sentence_data, dict) or 'verification_precheck' not in sentence_data:
+                    continue
+                if sentence_data.get('verification_source') != "llm":
+                    continue
+                audited += 1
+                agreed += sentence_data['verification_precheck'] == sentence_data.get('agent_verification')
+        return audited, (agreed / audited if audited else None)
\ No newline at end of file
@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that must only be imported when an agent is initialized, not when it is looked up
+HEAVY_MODULES = ("spacy", "langchain", "langchain_core", "langchain_community", "numpy", "pyarrow")
+
+def imported_modules(code: str) -> set:
+    """
+    Run code in a fresh interpreter with -X importtime and return the names of all imported modules.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.rstrip().endswith("imported package"):
+            continue
+        modules.add(line.rsplit("|", 1)[-1].strip())
+    return modules
+
+def test_agent_lookup_does_not_import_heavy_dependencies():
+    modules = imported_modules("import modules; modules.PassiveDetectorAgent")
+    assert "modules.utils" in modules  # imported by modules.passive_detect_agent
+    heavy = sorted(name for name in modules if name.split(".")[0] in HEAVY_MODULES)
+    assert heavy == []
@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from benchmarks.prompt_prefix import run_benchmark
+
+def test_prefix_layout_has_the_best_hit_rate_and_time_to_first_token():
+    results = run_benchmark(num_sentences=10, prefill_latency=1e-4)
+    assert results['prefix']['prefix_hit_rate'] > results['interleaved']['prefix_hit_rate']
+    assert results['prefix']['prefix_hit_rate'] > results['data first']['prefix_hit_rate']
+    assert results['prefix']['ttft_ms'] < results['interleaved']['ttft_ms']
+    assert results['prefix']['ttft_ms'] < results['data first']['ttft_ms']
@@ -0,0 +1,26 @@
+from modules.run_report import build_run_report, compare_run_reports, percentile
+
+def make_report(wall_seconds=10.0, stage_seconds=None, llm_calls=40):
+    stage_seconds = {'verifier': [1.0, 2.0, 3.0]} if stage_seconds is None else stage_seconds
+    return build_run_report(2, 100, 20, wall_seconds, stage_seconds, {'worker-1': {'llm_calls': llm_calls, 'peak_rss_mb': 500.0}})
+
+def regressions(baseline, current, max_regression=0.10):
+    return [metric for metric, _, _, _, regressed in compare_run_reports(baseline, current, max_regression) if regressed]
+
+def test_percentile():
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile(list(range(1, 11)), 95) == 10
+    assert percentile([], 50) is None
+
+def test_identical_reports_pass():
+    assert regressions(make_report(), make_report()) == []
+
+def test_slower_run_regresses():
+    assert regressions(make_report(), make_report(wall_seconds=12.0)) == ['sentences_per_sec', 'passives_per_sec']
+    assert regressions(make_report(), make_report(wall_seconds=12.0), max_regression=0.25) == []
+
+def test_more_llm_calls_regress():
+    assert regressions(make_report(), make_report(llm_calls=50)) == ['llm_calls_per_passive']
+
+def test_missing_stage_regresses():
+    assert regressions(make_report(), make_report(stage_seconds={})) == ['verifier.p50_seconds', 'verifier.p95_seconds']
@@ -0,0 +1,57 @@
+import pytest
+
+from modules.utils import segment_text, split_text_into_sentences
+
+@pytest.mark.parametrize("text, expected", [
+    # hard-wrapped prose is joined, even when a wrapped line is short
+    ("The report was\nwritten by the committee.", ["The report was written by the committee."]),
+    ("The proposal, which had been\ndiscussed for months,\nwas finally approved.",
+     ["The proposal, which had been discussed for months, was finally approved."]),
+    ("The data was collected\nin 2019. It was\nanalysed later.", ["The data was collected in 2019.", "It was analysed later."]),
+    # wrapped before a capitalised word: the "by" agent stays with its passive
+    ("The treaty was signed by\nPresident Wilson in 1919.", ["The treaty was signed by President Wilson in 1919."]),
+    ("The policy was introduced by\nThe Ministry of Health later.", ["The policy was introduced by The Ministry of Health later."]),
+    ("The results of\nThe Study were published.", ["The results of The Study were published."]),
+    ("After long negotiations the treaty was\nsigned by President\nWilson in 1919.",
+     ["After long negotiations the treaty was signed by President Wilson in 1919."]),
+])
+def test_wrapped_prose(text, expected):
+    assert split_text_into_sentences(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("Introduction\nThe report was written by the committee.", ["Introduction", "The report was written by the committee."]),
+    ("Results\n\nThe plan failed.", ["Results", "The plan failed."]),
+    ("The plan failed.\n\nConclusion", ["The plan failed.", "Conclusion"]),
+    ("Chapter 3\nThe committee met.", ["Chapter 3", "The committee met."]),
+    ("The plan failed.\nConclusion\nThe committee met.", ["The plan failed.", "Conclusion", "The committee met."]),
+    ("Results and discussion\n\nThe plan failed.", ["Results and discussion", "The plan failed."]),
+])
+def test_headings(text, expected):
+    assert split_text_into_sentences(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("Dr. Smith was invited. He accepted.", ["Dr. Smith was invited.", "He accepted."]),
+    ("The answer was no. A new plan was drafted.", ["The answer was no.", "A new plan was drafted."]),
+    ("See no. 5 in the list. It was approved.", ["See no. 5 in the list.", "It was approved."]),
+    ("It is cited on pp. 12-14 of the report. It was ignored.", ["It is cited on pp. 12-14 of the report.", "It was ignored."]),
+    ("It was made by Smith & Co. and sold. Prices rose.", ["It was made by Smith & Co. and sold.", "Prices rose."]),
+    ("The U.S. army was sent. It won.", ["The U.S. army was sent.", "It won."]),
+])
+def test_abbreviations(text, expected):
+    assert split_text_into_sentences(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("J. K. Rowling wrote it. The book was published.", ["J. K. Rowling wrote it.", "The book was published."]),
+    ("John F. Kennedy was elected. He won.", ["John F. Kennedy was elected.", "He won."]),
+    ("It is rich in vitamin C. It is good.", ["It is rich in vitamin C.", "It is good."]),
+    ("They chose plan B. A new team was formed.", ["They chose plan B.", "A new team was formed."]),
+])
+def test_initials(text, expected):
+    assert split_text_into_sentences(text) == expected
+
+def test_quoted_speech():
+    assert split_text_into_sentences('"Yes!" he said. It was done.') == ['"Yes!" he said.', "It was done."]
+
+def test_offsets_point_into_the_text():
+    text = "  The book was found.\nIt was examined by the historian.  "
+    assert [text[start:end] for start, end in segment_text(text)] == ["The book was found.", "It was examined by the historian."]
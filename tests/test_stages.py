@@ -0,0 +1,16 @@
+from modules.stages import changed_sentences, invalidate_overrides, stage_fingerprint, with_overriding_stages
+
+def test_verifier_overrides_inference_and_mystification():
+    assert with_overriding_stages(['mystification_classifier']) == ['mystification_classifier', 'verifier']
+    assert with_overriding_stages(['agent_inferencer']) == ['agent_inferencer', 'verifier']
+    assert with_overriding_stages(['deduce_agent']) == ['deduce_agent']
+    assert with_overriding_stages(['verifier']) == ['verifier']
+
+def test_recomputed_sentences_are_verified_again():
+    sentence_data = {'text': "It was decided.", 'voice_type': '2', 'co-text': "It was decided.", 'guessed_agent': "unknown",
+                     'agent_status': "unknown", 'mystification_idx': "3"}
+    sentence_data['stage_fingerprints'] = {'verifier': stage_fingerprint('verifier', sentence_data)}
+    assert changed_sentences('verifier', [sentence_data]) == []
+
+    invalidate_overrides('mystification_classifier', [sentence_data])
+    assert changed_sentences('verifier', [sentence_data]) == [sentence_data]